@@ -0,0 +1,175 @@
+# ================================================================
+# batch_questions.py — Concurrent batch answering for reports
+# ================================================================
+#
+# A monthly report asks the same 20–50 questions. Instead of invoking
+# the chain once per question in sequence, the questions are:
+#
+#   1. answered from rollups when they are aggregates (no LLM call)
+#   2. looked up in the answer cache (exact match) when one is given
+#   3. embedded together in ONE batch for retrieval, and looked up in
+#      the cache again by similarity with those vectors
+#   4. sent through the RAG chain concurrently (asyncio, bounded by a
+#      semaphore so the OpenAI rate limits are respected); fresh answers
+#      are stored in the cache
+#
+# The CLI uses the same answer cache as the assistant (--no-cache skips
+# it); answer_questions() only uses one when it is passed in.
+#
+# Results come back in input order with per-question timing and errors,
+# so a report takes about as long as its slowest question.
+
+import argparse
+import asyncio
+import json
+import time
+
+from instrumentation import get_instrumentation
+from query_finance_rag import get_finance_rag_chain, CHROMA_DIR
+from data_cleaning.storage import resolve_path
+from rag_engine.answer_cache import AnswerCache, data_version, filter_signature
+from rag_engine.embedding_backends import get_embeddings
+from rag_engine.embeddings import PrecomputedEmbeddings
+from rag_engine.structured_query import try_structured_answer
+from rag_engine.tracing import TraceCallbackHandler
+
+CONCURRENCY = 8
+
+
+def _result(question, started, answer=None, context=(), error=None, structured=False, cache=None):
+    return {
+        "question": question,
+        "answer": answer,
+        "context": [d.page_content for d in context],
+        "structured": structured,
+        "cache": cache,
+        "seconds": round(time.perf_counter() - started, 3),
+        "error": error,
+    }
+
+
+async def answer_questions(questions, concurrency=CONCURRENCY, chain=None, embeddings=None,
+                           cache=None):
+    """
+    Answer every question and return one result dict per question, in
+    input order: question, answer, context, structured, cache, seconds,
+    error. A failing question never aborts the batch. With an
+    AnswerCache, cached answers are reused and fresh ones stored.
+    """
+    questions = [str(q) for q in questions]
+    results = [None] * len(questions)
+
+    rag = []
+    for i, q in enumerate(questions):
+        started = time.perf_counter()
+        try:
+            fast = try_structured_answer(q)
+        except Exception:
+            fast = None
+        if fast is not None:
+            results[i] = _result(q, started, answer=fast["answer"], structured=True)
+        else:
+            rag.append(i)
+
+    def from_cache(indices, lookup):
+        """Fill results from cache hits; return the indices still to answer."""
+        from langchain_core.documents import Document
+        left = []
+        for i in indices:
+            started = time.perf_counter()
+            hit = lookup(i)
+            if hit is None:
+                left.append(i)
+            else:
+                context = [Document(**d) for d in hit["context"]]
+                results[i] = _result(questions[i], started, answer=hit["answer"],
+                                     context=context, cache=hit["cache"])
+        return left
+
+    version, filters = None, {}
+    if cache is not None and rag:
+        version = data_version(resolve_path(), CHROMA_DIR)
+        cache.set_version(version)
+        filters = {i: filter_signature(questions[i]) for i in rag}
+        rag = from_cache(rag, lambda i: cache.get_exact(questions[i], version, filters[i]))
+
+    if not rag:
+        return results
+
+    batch = None
+    if chain is None:
+        # One embeddings call for every RAG question; the retriever then
+        # reads the query vectors from memory instead of embedding again
+        base = embeddings or get_embeddings(directory=CHROMA_DIR)
+        batch = await asyncio.to_thread(
+            PrecomputedEmbeddings.for_queries, base, [questions[i] for i in rag]
+        )
+        chain = get_finance_rag_chain(embeddings=batch)
+        if cache is not None:
+            rag = from_cache(rag, lambda i: cache.get_semantic(
+                batch.vectors.get(questions[i]), version, filters[i]))
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    metrics = get_instrumentation()
+
+    async def run(i):
+        q = questions[i]
+        async with semaphore:
+            started = time.perf_counter()
+            # Each task runs in its own context, so concurrent spans never nest
+            with metrics.span("question", kind="query", route="rag", batch=True) as span:
+                config = {"callbacks": [TraceCallbackHandler(metrics, span)]} if metrics.enabled else None
+                try:
+                    res = await chain.ainvoke({"input": q}, config)
+                    results[i] = _result(q, started, answer=res["answer"], context=res.get("context", []))
+                    if cache is not None:
+                        context = [{"page_content": d.page_content, "metadata": dict(d.metadata)}
+                                   for d in res.get("context", [])]
+                        vector = batch.vectors.get(q) if batch is not None else None
+                        cache.put(q, version, filters[i], res["answer"], context, vector)
+                except Exception as e:
+                    span["error"] = f"{type(e).__name__}: {e}"
+                    results[i] = _result(q, started, error=span["error"])
+
+    await asyncio.gather(*(run(i) for i in rag))
+    return results
+
+
+def answer_questions_sync(questions, concurrency=CONCURRENCY, **kwargs):
+    """Blocking wrapper for scripts and schedulers."""
+    return asyncio.run(answer_questions(questions, concurrency, **kwargs))
+
+
+def read_questions(path):
+    """A JSON list of strings, or one question per line (# for comments)."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".json"):
+        return [str(q) for q in json.loads(text)]
+    return [
+        line.strip() for line in text.splitlines()
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions concurrently.")
+    parser.add_argument("questions", help="text file (one question per line) or JSON list")
+    parser.add_argument("-o", "--output", default="data/report_answers.json", help="JSON output path")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help="max questions in flight at once")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ignore and do not fill the answer cache")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    start = time.perf_counter()
+    cache = None if args.no_cache else AnswerCache()
+    results = answer_questions_sync(questions, args.concurrency, cache=cache)
+    elapsed = time.perf_counter() - start
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failed = sum(r["error"] is not None for r in results)
+    print(f"✔ {len(results)} questions in {elapsed:.1f}s ({failed} failed) → {args.output}")
@@ -0,0 +1,192 @@
+# ================================================================
+# generate.py — Deterministic synthetic BG / SD statements + FX table
+# ================================================================
+#
+# Produces workbooks shaped exactly like the real exports in data/
+# (preamble rows, header row, BG debit/credit columns with datetimes,
+# SD Spanish-formatted text amounts with "−" signs), plus a daily
+# fx_rates.csv covering the generated period. Same (rows, seed) → same
+# bytes, so benchmark runs are comparable.
+#
+# Excel sheets stop at 1,048,576 rows, so large statements are split
+# into several files per bank (the loader handles any number of them).
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+OUT_DIR = "benchmarks/.data"
+MAX_ROWS_PER_FILE = 1_000_000
+START = pd.Timestamp("2023-12-01")
+END = pd.Timestamp("2025-11-30")
+
+CITIES = ["MADRID", "PAMPLONA", "BARCELONA", "BILBAO", "SEVILLA"]
+PEOPLE = [
+    "ANA VICTORIA SANCHEZ CASTILLO", "RODRIGO MARTINEZ REYNA",
+    "JOSE MANUEL LLAVONA PORCELLA", "MARICARMEN SIMON CANDANEDO",
+]
+
+# (merchant, typical amount, share) — mixes rule hits and "Otros"
+MERCHANTS = [
+    ("MERCADONA", 35.0, 10), ("EROSKI CENTER ITURRAMA", 25.0, 8), ("PRIMAPRIX T197", 8.0, 8),
+    ("SODEXO CORNER AMIGOS", 3.5, 8), ("MACCHIATO", 4.0, 5), ("KEBAB ISTANBUL", 9.0, 4),
+    ("GOOD BURGER", 14.0, 3), ("ZARA", 30.0, 2), ("AMAZON MKTPLACE", 22.0, 4),
+    ("SPOTIFY", 6.99, 2), ("GOOGLE Google One", 1.99, 2), ("UBER RIDES", 11.0, 4),
+    ("RENFE VIAJEROS", 28.0, 2), ("VIVAGYM", 29.9, 1), ("FARMACIA CENTRAL", 12.0, 2),
+    ("CINESA", 9.5, 1), ("PELUQUERIA ESTILO", 15.0, 1), ("NYX ABServiciosSelecta", 1.2, 10),
+    ("ESTANCO ITURRAMA 37", 6.0, 3), ("UNITY TO GO", 5.0, 3),
+]
+
+
+def _weights(items):
+    w = np.array([m[2] for m in items], dtype=float)
+    return w / w.sum()
+
+
+def synthetic_transactions(n_rows, seed=0, bank="BG"):
+    """Frame of n_rows synthetic movements (date, description, amount), newest first."""
+    rng = np.random.default_rng([seed, 0 if bank == "BG" else 1])
+    span = int((END - START).total_seconds())
+
+    dates = START + pd.to_timedelta(np.sort(rng.integers(0, span, n_rows))[::-1], unit="s")
+    if bank == "BG":
+        dates = dates.normalize() + pd.Timedelta(hours=13, seconds=8)   # like the export
+    else:
+        dates = dates.normalize()
+
+    kind = rng.random(n_rows)
+    merchant = rng.choice(len(MERCHANTS), n_rows, p=_weights(MERCHANTS))
+    base = np.array([m[1] for m in MERCHANTS])[merchant]
+    amount = -np.round(base * rng.lognormal(0.0, 0.5, n_rows), 2)
+
+    names = np.array([m[0] for m in MERCHANTS], dtype=object)[merchant]
+    city = np.array(CITIES, dtype=object)[rng.integers(0, len(CITIES), n_rows)]
+    person = np.array(PEOPLE, dtype=object)[rng.integers(0, len(PEOPLE), n_rows)]
+
+    if bank == "BG":
+        card = names + "-4187-94XX-XXXX-0407"
+        desc = np.where(
+            kind < 0.85, card,
+            np.where(kind < 0.93, "YAPPY BG A " + person,
+                     "BANCA MOVIL TRANSFERENCIA DE 0472968590622 LEONARDO ENRIQUE "
+                     "SANCHEZ CASTILLO ENTRE CUENTAS"),
+        )
+    else:
+        card = "PAGO MOVIL EN " + names + ", " + city + ", TARJ. :*534717"
+        desc = np.where(
+            kind < 0.85, card,
+            np.where(kind < 0.93, "BIZUM A FAVOR DE " + person + " CONCEPTO Sin concepto",
+                     "BIZUM DE " + person + " CONCEPTO Sin concepto"),
+        )
+
+    # transfers in (income) for the last bucket, transfers out otherwise
+    income = kind >= 0.93
+    amount = np.where(income, np.round(rng.uniform(10, 400, n_rows), 2), amount)
+    amount = np.where((kind >= 0.85) & ~income, -np.round(rng.uniform(5, 200, n_rows), 2), amount)
+
+    return pd.DataFrame({"date": dates, "description": desc, "amount": amount})
+
+
+def _spanish_amount(values):
+    """-1234.5 -> "−1.234,50" (Santander export style)."""
+    text = pd.Series(np.abs(values)).map("{:,.2f}".format)
+    text = text.str.replace(",", "_").str.replace(".", ",").str.replace("_", ".")
+    return np.where(values < 0, "−" + text, text)
+
+
+def write_bg(df, path):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("BGRExcelContReport")
+    ws.append([None])
+    ws.append([None, "Últimos movimientos"])
+    ws.append([None])
+    ws.append(["Cuenta:Administracion mensual 04-89-17-035635-0"])
+    ws.append([None])
+    ws.append([None])
+    ws.append([None])
+    ws.append(["Fecha", None, "Referencia", "Transacción", "Descripción",
+               "Débito", "Crédito", None, "Saldo total", None])
+
+    balance = np.cumsum(df["amount"].to_numpy()[::-1])[::-1].round(2)
+    for date, desc, amount, bal in zip(pd.DatetimeIndex(df["date"]).to_pydatetime(), df["description"],
+                                       df["amount"].to_numpy(), balance):
+        debit, credit = (float(amount), None) if amount < 0 else (None, float(amount))
+        ws.append([date, None, "0", "264" if amount < 0 else "253", desc,
+                   debit, credit, None, float(bal), None])
+    wb.save(path)
+
+
+def write_sd(df, path):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append([None, None, "CUENTA SANTANDER", "FECHA", None, None])
+    ws.append([None, None, "ES00 0000 0000 0000 0000 0000", "30/11/2025 | 12:00:00", None, None])
+    ws.append([None, None, "Titular", "Saldo", None, None])
+    ws.append([None, None, "SYNTHETIC HOLDER", "0,00 EUR", None, None])
+    ws.append([None] * 6)
+    ws.append(["Movimientos", None, None, None, None, None])
+    ws.append(["Fecha operación", "Fecha valor", "Concepto", "Importe", "Saldo", "Divisa"])
+
+    day = df["date"].dt.strftime("%d/%m/%Y").to_numpy()
+    amount = _spanish_amount(df["amount"].to_numpy())
+    balance = _spanish_amount(np.cumsum(df["amount"].to_numpy()[::-1])[::-1].round(2))
+    for d, desc, a, b in zip(day, df["description"], amount, balance):
+        ws.append([d, d, desc, a, b, "EUR"])
+    wb.save(path)
+
+
+def synthetic_fx(seed=0):
+    """Business-day USD-per-EUR random walk over the generated period."""
+    rng = np.random.default_rng([seed, 2])
+    days = pd.bdate_range(START - pd.Timedelta(days=7), END)
+    rate = 1.08 * np.exp(np.cumsum(rng.normal(0, 0.003, len(days))))
+    return pd.DataFrame({"Date": days.strftime("%Y-%m-%d"), "USD": rate.round(4)})
+
+
+def generate(n_rows, seed=0, out_dir=OUT_DIR, max_rows_per_file=MAX_ROWS_PER_FILE):
+    """
+    Write ~n_rows movements split evenly between BG and SD (cached: an
+    existing complete set is reused). Returns (sources, fx_path) where
+    sources is a list of (bank, path) pairs for load_all / run_pipeline.
+    """
+    target = os.path.join(out_dir, f"rows{n_rows}_seed{seed}")
+    os.makedirs(target, exist_ok=True)
+    done = os.path.join(target, ".complete")
+
+    per_bank = {"BG": n_rows - n_rows // 2, "SD": n_rows // 2}
+    sources = []
+    for bank, rows in per_bank.items():
+        n_files = max(1, -(-rows // max_rows_per_file))
+        for part in range(n_files):
+            sources.append((bank, os.path.join(target, f"{bank}_{part:02d}.xlsx")))
+    fx_path = os.path.join(target, "fx_rates.csv")
+
+    if os.path.exists(done):
+        return sources, fx_path
+
+    writers = {"BG": write_bg, "SD": write_sd}
+    for bank, rows in per_bank.items():
+        df = synthetic_transactions(rows, seed, bank)
+        files = [p for b, p in sources if b == bank]
+        for part, chunk in enumerate(np.array_split(np.arange(rows), len(files))):
+            writers[bank](df.iloc[chunk], files[part])
+
+    synthetic_fx(seed).to_csv(fx_path, index=False)
+    open(done, "w").close()
+    return sources, fx_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic bank statements.")
+    parser.add_argument("rows", type=int, help="total movements (split between BG and SD)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=OUT_DIR)
+    args = parser.parse_args()
+
+    sources, fx_path = generate(args.rows, args.seed, args.out)
+    for bank, path in sources:
+        print(f"{bank}: {path}")
+    print(f"FX: {fx_path}")
@@ -0,0 +1,186 @@
+# ================================================================
+# run_benchmarks.py — Per-stage timings and peak memory vs baselines
+# ================================================================
+#
+#   python benchmarks/run_benchmarks.py                      # 10k + 100k rows
+#   python benchmarks/run_benchmarks.py --sizes 10k,1m,5m
+#   python benchmarks/run_benchmarks.py --update-baselines   # accept new numbers
+#
+# Inputs come from generate.py (synthetic, deterministic, cached), so
+# everything runs offline. Each stage is timed on its own (best of
+# --repeat runs), then the whole run_pipeline is timed end to end.
+# A second pass under tracemalloc records each stage's peak Python /
+# NumPy allocation (the load stage runs in-process for that pass, since
+# worker processes are invisible to tracemalloc).
+#
+# Results are compared with baselines.json: a stage slower than
+# baseline × (1 + --time-tolerance) + --time-slack, or using more memory
+# than baseline × (1 + --memory-tolerance) + MEMORY_SLACK_MB, makes the
+# run exit with code 1. The absolute slack keeps millisecond stages from
+# failing on scheduler noise.
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from data_cleaning import load_all, normalize, categorize, enrich   # noqa: E402
+from runner import fx_stage, run_pipeline                          # noqa: E402
+from generate import generate                                       # noqa: E402  (sibling script)
+
+BASELINES_PATH = "benchmarks/baselines.json"
+DEFAULT_SIZES = [10_000, 100_000]
+TIME_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.25
+TIME_SLACK = 0.05        # seconds
+MEMORY_SLACK_MB = 1.0
+
+
+def parse_size(text):
+    text = text.strip().lower().replace("_", "")
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+def stages(sources, fx_path, in_process=False):
+    workers = 1 if in_process else None
+    return [
+        ("load", lambda _: load_all(*sources, max_workers=workers)),
+        ("fx", fx_stage(fx_path)),
+        ("normalize", normalize),
+        ("categorize", categorize),
+        ("enrich", enrich),
+    ]
+
+
+def _timed(fn, arg, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        out = fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def _peak(fn, arg):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        out = fn(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2**20, out
+
+
+def bench_size(n_rows, seed=0, repeat=3, memory=True):
+    sources, fx_path = generate(n_rows, seed)
+    result = {}
+
+    df = None
+    for name, fn in stages(sources, fx_path):
+        seconds, df = _timed(fn, df, repeat)
+        result[name] = {"seconds": round(seconds, 4), "rows_per_s": round(len(df) / seconds)}
+
+    if memory:
+        df = None
+        for name, fn in stages(sources, fx_path, in_process=True):
+            peak_mb, df = _peak(fn, df)
+            result[name]["peak_mb"] = round(peak_mb, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "processed.parquet")
+        seconds, _ = _timed(
+            lambda _: run_pipeline(use_cache=False, sources=sources, fx_path=fx_path,
+                                   output_path=output),
+            None, 1,
+        )
+    result["run_pipeline"] = {"seconds": round(seconds, 4), "rows_per_s": round(n_rows / seconds)}
+    return result
+
+
+def compare(results, baselines, time_tol=TIME_TOLERANCE, memory_tol=MEMORY_TOLERANCE,
+            time_slack=TIME_SLACK, memory_slack=MEMORY_SLACK_MB):
+    """Return a list of human-readable regressions (empty when all good)."""
+    failures = []
+    for size, stages_ in results.items():
+        base = baselines.get(size, {})
+        for stage, r in stages_.items():
+            b = base.get(stage)
+            if not b:
+                continue
+            if r["seconds"] > b["seconds"] * (1 + time_tol) + time_slack:
+                failures.append(
+                    f"{size} rows / {stage}: {r['seconds']:.3f}s vs baseline {b['seconds']:.3f}s"
+                )
+            if ("peak_mb" in r and "peak_mb" in b
+                    and r["peak_mb"] > b["peak_mb"] * (1 + memory_tol) + memory_slack):
+                failures.append(
+                    f"{size} rows / {stage}: peak {r['peak_mb']:.1f} MB vs baseline {b['peak_mb']:.1f} MB"
+                )
+    return failures
+
+
+def report(results, baselines):
+    print(f"\n{'rows':>9} {'stage':<13} {'seconds':>9} {'base':>9} {'rows/s':>11} {'peak MB':>9} {'base':>9}")
+    for size, stages_ in results.items():
+        for stage, r in stages_.items():
+            b = baselines.get(size, {}).get(stage, {})
+            print(f"{size:>9} {stage:<13} {r['seconds']:>9.3f} {b.get('seconds', float('nan')):>9.3f} "
+                  f"{r['rows_per_s']:>11,} {r.get('peak_mb', float('nan')):>9.1f} "
+                  f"{b.get('peak_mb', float('nan')):>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic data.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma separated row counts, e.g. 10k,100k,1m,5m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="store these results as the new baselines")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument("--time-slack", type=float, default=TIME_SLACK,
+                        help="seconds a stage may exceed its tolerance by (timer noise)")
+    args = parser.parse_args()
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    results = {}
+    for n in sizes:
+        print(f"\n⏱️ {n:,} rows")
+        results[str(n)] = bench_size(n, args.seed, args.repeat, memory=not args.no_memory)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    report(results, baselines)
+
+    if args.update_baselines:
+        baselines.update(results)
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baselines updated: {args.baselines}")
+        sys.exit(0)
+
+    failures = compare(results, baselines, args.time_tolerance, args.memory_tolerance,
+                       args.time_slack)
+    if failures:
+        print("\n❌ PERFORMANCE REGRESSION")
+        for f in failures:
+            print(f"   {f}")
+        sys.exit(1)
+    print("\n✔ No regressions against baselines")
@@ -0,0 +1,115 @@
+# ================================================================
+# startup.py — Import and cold-start timings for dashboard / CLI
+# ================================================================
+#
+# Every measurement runs in a fresh interpreter (nothing cached in
+# sys.modules), from the repository root:
+#
+#   python benchmarks/startup.py                 # print a table
+#   python benchmarks/startup.py --json out.json # also save the numbers
+#   python benchmarks/startup.py --check         # exit 1 if the light path
+#                                                # imports LLM / vector-store code
+#
+# The "light path" is what dashboard.py loads before any question is
+# asked: the data layer and query_finance_rag itself. It must not pull
+# in LangChain, OpenAI or Chroma.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_openai", "langchain_chroma", "chromadb", "openai"]
+LIGHT_MODULES = ["dashboard_data", "data_cleaning.storage", "query_finance_rag"]
+
+PROBE = """
+import json, sys, time
+t = time.perf_counter()
+{setup}
+elapsed = time.perf_counter() - t
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+STEPS = {
+    # name: (code timed in a fresh interpreter, must stay light)
+    "import dashboard_data": ("import dashboard_data", True),
+    "import data_cleaning.storage": ("import data_cleaning.storage", True),
+    "import query_finance_rag": ("import query_finance_rag", True),
+    "dashboard data cold start": (
+        "from dashboard_data import DashboardData\n"
+        "from data_cleaning.storage import load_processed\n"
+        "DashboardData(load_processed(columns=['date', 'description', 'amount', "
+        "'amount_signed', 'type', 'source', 'auto_category']))",
+        True,
+    ),
+    "RAG chain cold start": (
+        "from query_finance_rag import get_finance_rag_chain\n"
+        "get_finance_rag_chain()",
+        False,
+    ),
+}
+
+
+def measure(code):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-startup-benchmark")   # no request is made
+    env["ANONYMIZED_TELEMETRY"] = "False"
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE.format(setup=code, heavy=HEAVY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"seconds": None, "heavy": [], "error": proc.stderr.strip().splitlines()[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run(repeat=3):
+    results = {}
+    for name, (code, light) in STEPS.items():
+        runs = [measure(code) for _ in range(repeat)]
+        ok = [r["seconds"] for r in runs if r["seconds"] is not None]
+        results[name] = {
+            "seconds": min(ok) if ok else None,      # best of N: least noisy
+            "heavy": runs[0]["heavy"],
+            "light": light,
+            "error": runs[0].get("error"),
+        }
+    return results
+
+
+def report(results):
+    print(f"{'step':<30} {'seconds':>8}  heavy modules loaded")
+    for name, r in results.items():
+        secs = "error" if r["seconds"] is None else f"{r['seconds']:.3f}"
+        heavy = ", ".join(r["heavy"]) or "-"
+        flag = "  ⚠️ should be light" if r["light"] and r["heavy"] else ""
+        print(f"{name:<30} {secs:>8}  {heavy}{flag}")
+        if r["error"]:
+            print(f"{'':<30} {r['error']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import and cold-start times.")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per step (best is kept)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--check", action="store_true",
+                        help="fail if a light step imports LangChain / OpenAI / Chroma")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        leaks = [n for n, r in results.items() if r["light"] and (r["heavy"] or r["error"])]
+        if leaks:
+            print(f"❌ heavy imports on the light path: {', '.join(leaks)}")
+            sys.exit(1)
+        print("✔ light path clean")
@@ -1,50 +1,272 @@
 import os
 import shutil
+import json
+import hashlib
+import argparse
 import pandas as pd
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
 
+from data_cleaning.utils import transaction_ids
+from data_cleaning.storage import load_processed, processed_columns, resolve_path
+from rag_engine.lexical_index import LexicalIndex
+from rag_engine.answer_cache import MANIFEST_FILE
+from rag_engine.summaries import build_summaries, merchant_names, SUMMARY_COLUMNS, TRANSACTION
+from rag_engine.embeddings import (
+    EmbeddingCache, embed_texts, add_embeddings,
+    BATCH_SIZE, MAX_WORKERS, INSERT_BATCH_SIZE,
+)
+from rag_engine.embedding_backends import (
+    BACKENDS, get_embeddings, embedding_info, resolve_backend, stored_embedding,
+)
+
 load_dotenv()
 
 CHROMA_DIR = "data/chroma_finance_db"
-DATASET_PATH = "data/Finance_Processed.csv"
+ID_COLUMNS = ["date", "description", "amount_signed", "source"]
+
+
+METADATA_COLUMNS = ["date", "description", "auto_category", "source", "type", "amount_signed"]
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
 
+def metadata_hash(meta):
+    payload = json.dumps(meta, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
 
-def build_vectorstore():
 
-    # 1. Load dataset
-    if not os.path.exists(DATASET_PATH):
-        raise FileNotFoundError("Dataset missing in data/Finance_Processed.csv")
+def transaction_metadata(df):
+    """
+    Structured fields stored next to each vector so the retriever can
+    pre-filter: document type, sortable date (YYYYMMDD), year-month,
+    category, bank, type and signed amount. The merchant label lets the
+    context packer collapse repeated charges.
+    """
+    date = pd.to_datetime(df["date"], errors="coerce")
+    meta = pd.DataFrame({
+        "doc_type": TRANSACTION,
+        "date_int": (date.dt.year * 10000 + date.dt.month * 100 + date.dt.day).fillna(0).astype("int64"),
+        "ym": date.dt.strftime("%Y-%m").fillna(""),
+        "auto_category": df["auto_category"].astype(str),
+        "merchant": merchant_names(df["description"]),
+        "source": df["source"].astype(str),
+        "type": df["type"].astype(str),
+        "amount_signed": pd.to_numeric(df["amount_signed"], errors="coerce").fillna(0).round(2).astype(float),
+    })
+    return meta.to_dict("records")
 
-    df = pd.read_csv(DATASET_PATH)
 
-    if "RAG_Text" not in df.columns:
+def load_documents(path=None):
+    """Return (ids, texts, metadatas) from the processed dataset."""
+    path = resolve_path(path)
+    available = processed_columns(path)
+
+    if "RAG_Text" not in available:
         raise ValueError("RAG_Text column missing!")
 
-    texts = df["RAG_Text"].astype(str).tolist()
-    ids = [f"tx_{i}" for i in range(len(texts))]
+    columns = list(dict.fromkeys(METADATA_COLUMNS + ["RAG_Text"]))
+
+    # Older datasets have no tx_id column yet: derive it from the raw fields
+    if "tx_id" in available:
+        df = load_processed(path, columns=columns + ["tx_id"])
+        ids = df["tx_id"]
+    else:
+        df = load_processed(path, columns=list(dict.fromkeys(columns + ID_COLUMNS)))
+        ids = transaction_ids(df)
+
+    return (
+        ids.astype(str).tolist(),
+        df["RAG_Text"].astype(str).tolist(),
+        transaction_metadata(df),
+    )
+
+
+def load_summaries(path=None):
+    """Month / category / month x category summary documents."""
+    path = resolve_path(path)
+    return build_summaries(load_processed(path, columns=SUMMARY_COLUMNS))
+
+
+def write_manifest(ids, metadatas, directory=CHROMA_DIR, embedding=None):
+    """
+    Content version of the collection (ids + text/metadata hashes + the
+    embedder that produced the vectors), read by the answer cache to
+    invalidate answers after a rebuild and by queries to pick a
+    compatible embedder.
+    """
+    h = hashlib.sha256()
+    if embedding:
+        h.update(json.dumps(embedding, sort_keys=True).encode())
+    for i, m in sorted(zip(ids, metadatas), key=lambda x: x[0]):
+        h.update(f"{i}:{m['text_hash']}:{m['meta_hash']};".encode())
+
+    manifest = {"version": h.hexdigest()[:24], "documents": len(ids)}
+    if embedding:
+        manifest["embedding"] = embedding
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def diff_collection(existing, ids, hashes):
+    """
+    Compare {id: (text_hash, meta_hash)} already stored with the dataset.
+    Returns (new_ids, changed_ids, meta_ids, removed_ids): changed rows
+    need a new embedding, meta rows only a metadata update.
+    """
+    wanted = dict(zip(ids, hashes))
+
+    new_ids = [i for i in ids if i not in existing]
+    changed_ids = [i for i in ids if i in existing and existing[i][0] != wanted[i][0]]
+    meta_ids = [
+        i for i in ids
+        if i in existing and existing[i][0] == wanted[i][0] and existing[i][1] != wanted[i][1]
+    ]
+    removed_ids = [i for i in existing if i not in wanted]
+
+    return new_ids, changed_ids, meta_ids, removed_ids
 
-    # 2. Delete old DB
-    if os.path.exists(CHROMA_DIR):
-        print("🗑️ Removing old Chroma DB...")
-        shutil.rmtree(CHROMA_DIR)
 
-    # 3. Init embeddings + vector DB
-    print("⚡ Creating new embeddings...")
+def sync_vectorstore(vectorstore, ids, texts, metadatas=None, embeddings=None, cache=None,
+                     batch_size=BATCH_SIZE, max_workers=MAX_WORKERS):
+    """Embed only new/changed rows and delete rows that disappeared."""
+    metadatas = metadatas or [{} for _ in ids]
+    metadatas = [
+        {**m, "text_hash": text_hash(t), "meta_hash": metadata_hash(m)}
+        for t, m in zip(texts, metadatas)
+    ]
+    hashes = [(m["text_hash"], m["meta_hash"]) for m in metadatas]
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    stored = vectorstore.get(include=["metadatas"])
+    existing = {
+        i: ((m or {}).get("text_hash"), (m or {}).get("meta_hash"))
+        for i, m in zip(stored["ids"], stored["metadatas"])
+    }
+
+    new_ids, changed_ids, meta_ids, removed_ids = diff_collection(existing, ids, hashes)
+
+    print(f"🔎 {len(new_ids)} new, {len(changed_ids)} changed, "
+          f"{len(meta_ids)} metadata-only, {len(removed_ids)} removed, "
+          f"{len(ids) - len(new_ids) - len(changed_ids) - len(meta_ids)} unchanged")
+
+    stale = changed_ids + removed_ids
+    if stale:
+        vectorstore.delete(ids=stale)
+
+    position = {i: k for k, i in enumerate(ids)}
+
+    # Metadata-only changes never need a new embedding
+    for start in range(0, len(meta_ids), INSERT_BATCH_SIZE):
+        chunk = meta_ids[start:start + INSERT_BATCH_SIZE]
+        vectorstore._collection.update(
+            ids=chunk,
+            metadatas=[metadatas[position[i]] for i in chunk],
+        )
+
+    pending = new_ids + changed_ids
+    if pending:
+        rows = [position[i] for i in pending]
+        pending_texts = [texts[k] for k in rows]
+
+        vectors = embed_texts(
+            pending_texts,
+            embeddings or vectorstore.embeddings,
+            cache=cache,
+            batch_size=batch_size,
+            max_workers=max_workers,
+        )
+        add_embeddings(
+            vectorstore,
+            ids=pending,
+            texts=pending_texts,
+            vectors=vectors,
+            metadatas=[metadatas[k] for k in rows],
+        )
+
+    return new_ids, changed_ids, meta_ids, removed_ids
+
+
+def build_vectorstore(rebuild=False, offline=False, summaries=True,
+                      batch_size=BATCH_SIZE, max_workers=MAX_WORKERS, backend=None):
+
+    # 1. Load dataset (+ summary documents, indexed next to the transactions)
+    ids, texts, metadatas = load_documents()
+    if summaries:
+        s_ids, s_texts, s_metas = load_summaries()
+        print(f"🧾 {len(s_ids)} summary documents")
+        ids, texts, metadatas = ids + s_ids, texts + s_texts, metadatas + s_metas
+
+    # 2. Embedder (--backend > FINANCE_EMBEDDINGS > the existing collection's)
+    backend = resolve_backend("fake" if offline else backend, CHROMA_DIR)
+    embeddings = get_embeddings(backend, None if rebuild else CHROMA_DIR)
+    info = embedding_info(embeddings)
+    print(f"🧬 Embeddings: {info['backend']} {info['model']} ({info['dim']} dims)")
+
+    # Vectors of another model cannot share the collection: start over
+    stored_info = stored_embedding(CHROMA_DIR)
+    if not rebuild and stored_info and stored_info != info:
+        print(f"🔁 Collection was embedded with {stored_info.get('model')}: full rebuild")
+        rebuild = True
+
+    # 3. Delete old DB only on a full rebuild
+    if rebuild and os.path.exists(CHROMA_DIR):
+        print("🗑️ Removing old Chroma DB...")
+        shutil.rmtree(CHROMA_DIR)
 
     vectorstore = Chroma(
         embedding_function=embeddings,
         persist_directory=CHROMA_DIR
     )
 
-    # 4. Add documents manually (Windows safe)
-    vectorstore.add_texts(texts=texts, ids=ids)
+    # 4. Embed only what changed since the last build (Windows safe)
+    # (local vectors are cheaper to recompute than to read back from SQLite)
+    print("⚡ Syncing embeddings...")
+    cache = EmbeddingCache() if backend != "local" else None
+    try:
+        sync_vectorstore(vectorstore, ids, texts, metadatas, embeddings, cache,
+                         batch_size=batch_size, max_workers=max_workers)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    # 5. Keep the BM25 index next to the collection in sync
+    lexical = LexicalIndex() if rebuild else LexicalIndex.load(CHROMA_DIR)
+    stored = [
+        {**m, "text_hash": text_hash(t), "meta_hash": metadata_hash(m)}
+        for t, m in zip(texts, metadatas)
+    ]
+    added, patched = lexical.sync(ids, texts, stored)
+    lexical.save(CHROMA_DIR)
+    print(f"🔤 Lexical index: {added} (re)indexed, {patched} metadata updates")
+
+    write_manifest(ids, stored, CHROMA_DIR, embedding=info)
 
-    print("📦 New vectorstore created:", CHROMA_DIR)
+    print("📦 Vectorstore up to date:", CHROMA_DIR)
 
 
 if __name__ == "__main__":
-    build_vectorstore()
+    parser = argparse.ArgumentParser(description="Build or sync the Chroma vectorstore.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="wipe the collection and re-embed everything")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="embedding backend (default: FINANCE_EMBEDDINGS, else the "
+                             "collection's, else openai)")
+    parser.add_argument("--offline", action="store_true",
+                        help="use a deterministic fake embedder instead of OpenAI (testing)")
+    parser.add_argument("--no-summaries", action="store_true",
+                        help="index transactions only (no month / category summaries)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+
+    build_vectorstore(
+        rebuild=args.rebuild,
+        offline=args.offline,
+        summaries=not args.no_summaries,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+        backend=args.backend,
+    )
@@ -2,13 +2,15 @@
 # PERSONAL FINANCE DASHBOARD — Notion/Minimal Redesign
 # ================================================================
 
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
-from query_finance_rag import get_finance_rag_chain
+from data_cleaning.storage import load_processed
+from dashboard_data import DashboardData, Filters
 
 
 # ================================================================
@@ -33,13 +35,19 @@ st.markdown("""
 # ================================================================
 # LOAD DATA
 # ================================================================
-@st.cache_data
+DASHBOARD_COLUMNS = [
+    "date", "description", "amount", "amount_signed",
+    "type", "source", "auto_category",
+]
+
+
+@st.cache_resource
 def load_data():
-    df = pd.read_csv("data/Finance_Processed.csv")
-    df["date"] = pd.to_datetime(df["date"])
-    return df
+    # Typed Parquet read: dates/categoricals arrive ready, RAG_Text is skipped.
+    # Sorted / coded once per process; aggregates are memoized per filter set.
+    return DashboardData(load_processed(columns=DASHBOARD_COLUMNS))
 
-df = load_data()
+data = load_data()
 
 
 # ================================================================
@@ -48,58 +56,49 @@ df = load_data()
 st.sidebar.title("🔧 Filters")
 
 # DATE RANGE
-min_date, max_date = df["date"].min(), df["date"].max()
+min_date, max_date = data.date_bounds
 date_range = st.sidebar.date_input(
     "📆 Date range",
     (min_date, max_date),
     min_value=min_date,
     max_value=max_date
 )
-
-df_filtered = df[
-    (df["date"] >= pd.to_datetime(date_range[0])) &
-    (df["date"] <= pd.to_datetime(date_range[1]))
-]
+if len(date_range) == 1:    # second date not picked yet
+    date_range = (date_range[0], max_date)
 
 # TYPE FILTER
-type_filter = st.sidebar.multiselect(
-    "💼 Transaction type",
-    df["type"].unique(),
-    default=df["type"].unique()
-)
-df_filtered = df_filtered[df_filtered["type"].isin(type_filter)]
+types = data.options("type")
+type_filter = st.sidebar.multiselect("💼 Transaction type", types, default=types)
 
 # CATEGORY FILTER
-category_filter = st.sidebar.multiselect(
-    "🏷 Category",
-    sorted(df["auto_category"].unique()),
-    default=sorted(df["auto_category"].unique())
-)
-df_filtered = df_filtered[df_filtered["auto_category"].isin(category_filter)]
+categories = sorted(data.options("auto_category"))
+category_filter = st.sidebar.multiselect("🏷 Category", categories, default=categories)
 
 # SOURCE FILTER (NEW)
-source_filter = st.sidebar.multiselect(
-    "🏦 Bank source",
-    df["source"].unique(),
-    default=df["source"].unique()
-)
-df_filtered = df_filtered[df_filtered["source"].isin(source_filter)]
+sources = data.options("source")
+source_filter = st.sidebar.multiselect("🏦 Bank source", sources, default=sources)
 
 # AMOUNT RANGE FILTER (NEW)
-min_amt, max_amt = float(df["amount"].min()), float(df["amount"].max())
+min_amt, max_amt = data.amount_bounds
 amount_range = st.sidebar.slider(
     "💰 Amount range",
     min_amt, max_amt, (min_amt, max_amt)
 )
-df_filtered = df_filtered[
-    (df_filtered["amount"] >= amount_range[0]) &
-    (df_filtered["amount"] <= amount_range[1])
-]
 
 # TEXT SEARCH FILTER (NEW)
 text_search = st.sidebar.text_input("🔍 Search in description")
-if text_search.strip() != "":
-    df_filtered = df_filtered[df_filtered["description"].str.contains(text_search, case=False)]
+
+filters = Filters(
+    start=pd.Timestamp(date_range[0]),
+    end=pd.Timestamp(date_range[1]),
+    types=tuple(type_filter),
+    categories=tuple(category_filter),
+    sources=tuple(source_filter),
+    min_amount=amount_range[0],
+    max_amount=amount_range[1],
+    text=text_search,
+)
+agg = data.aggregates(filters)
 
 
 # ================================================================
@@ -116,19 +115,16 @@ with left:
 
     # KPIs
     col1, col2, col3 = st.columns(3)
-    total_expense = df_filtered[df_filtered["amount_signed"] < 0]["amount_signed"].sum()
-    total_income = df_filtered[df_filtered["amount_signed"] > 0]["amount_signed"].sum()
-    net_savings = df_filtered["amount_signed"].sum()
+    kpis = agg["kpis"]
 
-    col1.metric("📉 Total Expenses", f"{total_expense:.2f} €")
-    col2.metric("📈 Total Income", f"{total_income:.2f} €")
-    col3.metric("💰 Net Savings", f"{net_savings:.2f} €")
+    col1.metric("📉 Total Expenses", f"{kpis['expense']:.2f} €")
+    col2.metric("📈 Total Income", f"{kpis['income']:.2f} €")
+    col3.metric("💰 Net Savings", f"{kpis['net']:.2f} €")
 
     st.markdown("---")
 
     # Monthly trends
-    df_filtered["ym"] = df_filtered["date"].dt.to_period("M").astype(str)
-    monthly = df_filtered.groupby(["ym", "type"])["amount_signed"].sum().reset_index()
+    monthly = agg["monthly"]
 
     fig = px.bar(monthly, x="ym", y="amount_signed", color="type",
                 title="📅 Monthly Income vs Expenses", height=350)
@@ -137,7 +133,7 @@ with left:
     st.markdown("---")
 
     # Category Donut
-    cat_sum = df_filtered.groupby("auto_category")["amount_signed"].sum().abs()
+    cat_sum = agg["categories"]
     fig2 = px.pie(cat_sum, names=cat_sum.index, values=cat_sum.values,
                   title="🏷 Spending Breakdown by Category",
                   hole=0.5)
@@ -145,18 +141,8 @@ with left:
 
     st.markdown("---")
 
-    # HEATMAP (day vs month)
-    df_filtered["weekday"] = df_filtered["date"].dt.day_name()
-    df_filtered["month_name"] = df_filtered["date"].dt.month_name()
-
-    heat = df_filtered.groupby(["weekday", "month_name"])["amount_signed"].sum().reset_index()
-
-    # Fix weekday order for beautiful heatmap
-    order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    heat["weekday"] = pd.Categorical(heat["weekday"], categories=order, ordered=True)
-
-    # Correct pivot syntax
-    pivot = heat.pivot(index="weekday", columns="month_name", values="amount_signed").fillna(0)
+    # HEATMAP (day vs month), weekdays and months in calendar order
+    pivot = agg["heatmap"]
 
     fig3 = px.imshow(
         pivot,
@@ -175,17 +161,38 @@ with right:
 
     @st.cache_resource
     def load_rag():
-        return get_finance_rag_chain()
+        # Imported here so the charts never wait for the RAG module; the
+        # chain itself (LangChain, Chroma) is built on first question
+        from query_finance_rag import get_finance_assistant
+        return get_finance_assistant()
 
     rag = load_rag()
 
     user_q = st.text_area("Ask me anything about your finances:", height=120)
-    if st.button("💬 Ask"):
-        with st.spinner("Analyzing your finances..."):
-            try:
-                res = rag.invoke({"input": user_q})
-                st.markdown("### 💡 Answer:")
-                st.write(res["answer"])
-            except Exception as e:
-                st.error(f"Error: {e}")
+    show_sources = st.checkbox("Show source transactions", value=False)
 
+    if st.button("💬 Ask"):
+        sources_box = st.container()
+        st.markdown("### 💡 Answer:")
+
+        def answer_tokens(chunks):
+            # Sources are rendered as soon as retrieval finishes,
+            # answer tokens are handed to st.write_stream as they arrive
+            for chunk in chunks:
+                if show_sources and chunk.get("context"):
+                    with sources_box.expander(f"📄 Sources ({len(chunk['context'])})"):
+                        for doc in chunk["context"]:
+                            st.caption(doc.page_content)
+                if "answer" in chunk:
+                    yield chunk["answer"]
+
+        try:
+            with st.spinner("Analyzing your finances..."):
+                st.write_stream(answer_tokens(rag.stream({"input": user_q})))
+        except Exception as e:
+            st.error(f"Error: {e}")
+
+    # Page is rendered: build the chain in the background so the first
+    # question does not pay the cold start (set RAG_WARM_UP=0 to disable)
+    if os.getenv("RAG_WARM_UP", "1") != "0":
+        rag.warm_up()
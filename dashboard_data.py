@@ -0,0 +1,209 @@
+# ================================================================
+# dashboard_data.py — Indexed filters + memoized aggregates
+# ================================================================
+#
+# Streamlit re-runs dashboard.py on every widget interaction. Instead of
+# chaining boolean masks that each copy the DataFrame and regrouping
+# from scratch, the data is prepared ONCE at load:
+#
+#   - rows sorted by date → a date range is two binary searches
+#   - type / category / source as integer codes → a multiselect filter
+#     is one lookup-table gather, no string comparisons
+#   - year-month, weekday and month codes precomputed
+#
+# KPIs, monthly and heatmap aggregates are np.bincount reductions over
+# the selected rows, memoized per filter combination.
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June", "July",
+    "August", "September", "October", "November", "December",
+]
+CODED_COLUMNS = ["type", "auto_category", "source"]
+MEMO_SIZE = 64
+
+
+@dataclass(frozen=True)
+class Filters:
+    """Sidebar state; hashable so it can key the aggregate memo."""
+
+    start: Optional[pd.Timestamp] = None
+    end: Optional[pd.Timestamp] = None          # inclusive, like the date picker
+    types: Optional[tuple] = None
+    categories: Optional[tuple] = None
+    sources: Optional[tuple] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    text: str = ""
+
+
+class DashboardData:
+
+    def __init__(self, df, memo_size=MEMO_SIZE):
+        df = df.sort_values("date", kind="stable").reset_index(drop=True)
+        date = pd.to_datetime(df["date"])
+
+        self.df = df
+        self.dates = date.to_numpy(dtype="datetime64[ns]")
+        self.amount = df["amount"].to_numpy(dtype=np.float64)
+        self.signed = df["amount_signed"].to_numpy(dtype=np.float64)
+        self.description = df["description"].astype(str)
+
+        self.codes, self.labels = {}, {}
+        for col in CODED_COLUMNS:
+            cat = df[col].astype("category")
+            self.codes[col] = cat.cat.codes.to_numpy(dtype=np.int16)
+            self.labels[col] = [str(c) for c in cat.cat.categories]
+
+        months = date.dt.year.to_numpy(dtype=np.int64) * 12 + date.dt.month.to_numpy() - 1
+        ym_codes, ym_keys = pd.factorize(months, sort=True)
+        self.ym = ym_codes.astype(np.int32)
+        self.ym_labels = [f"{k // 12}-{k % 12 + 1:02d}" for k in ym_keys]
+        self.weekday = date.dt.dayofweek.to_numpy(dtype=np.int8)
+        self.month = (date.dt.month - 1).to_numpy(dtype=np.int8)
+
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---------------------------------------------------------
+    # options for the sidebar widgets
+    # ---------------------------------------------------------
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def date_bounds(self):
+        return pd.Timestamp(self.dates[0]), pd.Timestamp(self.dates[-1])
+
+    @property
+    def amount_bounds(self):
+        return float(self.amount.min()), float(self.amount.max())
+
+    def options(self, column):
+        """Labels present in `column` (in first-appearance order for type/source)."""
+        codes = self.codes[column]
+        present = pd.unique(codes[codes >= 0])
+        return [self.labels[column][c] for c in present]
+
+    # ---------------------------------------------------------
+    # filtering
+    # ---------------------------------------------------------
+    def _date_slice(self, f):
+        lo, hi = 0, len(self.dates)
+        if f.start is not None:
+            lo = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(f.start)), side="left"))
+        if f.end is not None:
+            # end date is inclusive: everything before the next midnight
+            end = pd.Timestamp(f.end).normalize() + pd.Timedelta(days=1)
+            hi = int(np.searchsorted(self.dates, np.datetime64(end), side="left"))
+        return lo, max(lo, hi)
+
+    def _allowed(self, column, selected):
+        table = np.zeros(len(self.labels[column]) + 1, dtype=bool)   # last slot: NaN (-1)
+        lookup = {label: i for i, label in enumerate(self.labels[column])}
+        for label in selected:
+            if str(label) in lookup:
+                table[lookup[str(label)]] = True
+        return table
+
+    def select(self, f):
+        """Positions (into the date-sorted frame) of the rows matching `f`."""
+        lo, hi = self._date_slice(f)
+        mask = np.ones(hi - lo, dtype=bool)
+
+        for column, selected in (("type", f.types), ("auto_category", f.categories),
+                                 ("source", f.sources)):
+            if selected is not None:
+                mask &= self._allowed(column, selected)[self.codes[column][lo:hi]]
+
+        if f.min_amount is not None:
+            mask &= self.amount[lo:hi] >= f.min_amount
+        if f.max_amount is not None:
+            mask &= self.amount[lo:hi] <= f.max_amount
+
+        positions = lo + np.flatnonzero(mask)
+
+        if f.text.strip():
+            found = self.description.iloc[positions].str.contains(
+                f.text.strip(), case=False, regex=False, na=False
+            )
+            positions = positions[found.to_numpy()]
+        return positions
+
+    def frame(self, f):
+        return self.df.iloc[self.select(f)]
+
+    # ---------------------------------------------------------
+    # aggregates (memoized per filter combination)
+    # ---------------------------------------------------------
+    def aggregates(self, f):
+        with self._lock:
+            if f in self._memo:
+                self._memo.move_to_end(f)
+                return self._memo[f]
+
+        result = self._compute(self.select(f))
+
+        with self._lock:
+            self._memo[f] = result
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return result
+
+    def _compute(self, positions):
+        signed = self.signed[positions]
+
+        kpis = {
+            "expense": float(signed[signed < 0].sum()),
+            "income": float(signed[signed > 0].sum()),
+            "net": float(signed.sum()),
+            "count": int(len(positions)),
+        }
+
+        # Monthly income vs expenses: ym x type
+        n_types = len(self.labels["type"])
+        cell = self.ym[positions].astype(np.int64) * n_types + self.codes["type"][positions]
+        valid = self.codes["type"][positions] >= 0
+        sums = np.bincount(cell[valid], weights=signed[valid], minlength=len(self.ym_labels) * n_types)
+        counts = np.bincount(cell[valid], minlength=len(self.ym_labels) * n_types)
+        hit = np.flatnonzero(counts)
+        monthly = pd.DataFrame({
+            "ym": [self.ym_labels[i // n_types] for i in hit],
+            "type": [self.labels["type"][i % n_types] for i in hit],
+            "amount_signed": sums[hit],
+        })
+
+        # Category breakdown (absolute net per category)
+        codes = self.codes["auto_category"][positions]
+        valid = codes >= 0
+        n_cats = len(self.labels["auto_category"])
+        sums = np.bincount(codes[valid], weights=signed[valid], minlength=n_cats)
+        counts = np.bincount(codes[valid], minlength=n_cats)
+        hit = np.flatnonzero(counts)
+        categories = pd.Series(
+            np.abs(sums[hit]),
+            index=pd.Index([self.labels["auto_category"][i] for i in hit], name="auto_category"),
+            name="amount_signed",
+        )
+
+        # Heatmap: weekday x calendar month
+        cell = self.weekday[positions].astype(np.int64) * 12 + self.month[positions]
+        sums = np.bincount(cell, weights=signed, minlength=7 * 12).reshape(7, 12)
+        counts = np.bincount(cell, minlength=7 * 12).reshape(7, 12)
+        rows, cols = counts.any(axis=1), counts.any(axis=0)
+        heatmap = pd.DataFrame(
+            sums[rows][:, cols],
+            index=pd.Index([d for d, r in zip(WEEKDAYS, rows) if r], name="weekday"),
+            columns=pd.Index([m for m, c in zip(MONTH_NAMES, cols) if c], name="month_name"),
+        )
+
+        return {"kpis": kpis, "monthly": monthly, "categories": categories, "heatmap": heatmap}
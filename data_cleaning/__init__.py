@@ -2,6 +2,6 @@ from .loader import load_all
 from .normalizer import normalize
 from .categorizer import categorize
 from .enricher import enrich
-from .fx_converter import convert_usd_to_eur
+from .fx_converter import convert_usd_to_eur, convert_to_eur
 
-__all__ = ["load_all", "normalize", "categorize", "enrich", "convert_usd_to_eur"]
+__all__ = ["load_all", "normalize", "categorize", "enrich", "convert_usd_to_eur", "convert_to_eur"]
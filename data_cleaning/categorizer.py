@@ -3,8 +3,11 @@
 # ============================================================
 
 import re
+import numpy as np
 import pandas as pd
 
+from .schema import apply_schema, map_unique
+
 def normalize_text(x):
     return str(x).lower().strip()
 
@@ -60,15 +63,77 @@ CATEGORY_PATTERNS = {
 }
 
 
+# ============================================================
+# COMPILED MATCHER
+# ============================================================
+class CategoryMatcher:
+    """
+    Whole rule table compiled into one regex.
+
+    Every pattern sits in a named group inside a zero-width lookahead,
+    so a single scan visits each position once and reports all rules
+    that match there. The lowest rule index wins, which reproduces the
+    original "first category in CATEGORY_PATTERNS order" priority even
+    when a lower-priority pattern matches earlier in the text.
+    """
+
+    def __init__(self, patterns=None, default="Otros"):
+        patterns = CATEGORY_PATTERNS if patterns is None else patterns
+        self.default = default
+        self.categories = list(patterns)
+
+        groups = []
+        for i, pats in enumerate(patterns.values()):
+            for p in pats:
+                groups.append(f"(?P<c{i}_{len(groups)}>{p})")
+
+        self._group_cat = {}
+        self._regex = re.compile("(?=" + "|".join(groups) + ")") if groups else None
+        if self._regex is not None:
+            for name in self._regex.groupindex:
+                self._group_cat[name] = int(name[1:].split("_")[0])
+
+    def match(self, text):
+        if self._regex is None:
+            return self.default
+
+        best = None
+        for m in self._regex.finditer(text):
+            idx = self._group_cat[m.lastgroup]
+            if best is None or idx < best:
+                best = idx
+                if best == 0:
+                    break
+
+        return self.default if best is None else self.categories[best]
+
+    def categorize_series(self, s):
+        """Match only the unique normalized values and broadcast back."""
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return map_unique(s, self.categorize_series)
+
+        text = s.astype(str).str.lower().str.strip()
+        codes, uniques = pd.factorize(text)
+
+        labels = np.array([self.match(u) for u in uniques], dtype=object)
+        out = labels[codes] if len(uniques) else np.array([], dtype=object)
+        return pd.Series(out, index=s.index, dtype=object)
+
+
+_DEFAULT_MATCHER = None
+
+
+def get_matcher():
+    global _DEFAULT_MATCHER
+    if _DEFAULT_MATCHER is None:
+        _DEFAULT_MATCHER = CategoryMatcher(CATEGORY_PATTERNS)
+    return _DEFAULT_MATCHER
+
+
 def assign_category(desc):
-    text = normalize_text(desc)
-    for cat, patterns in CATEGORY_PATTERNS.items():
-        for p in patterns:
-            if re.search(p, text):
-                return cat
-    return "Otros"
-
-def categorize(df: pd.DataFrame) -> pd.DataFrame:
+    return get_matcher().match(normalize_text(desc))
+
+def categorize(df: pd.DataFrame, matcher=None) -> pd.DataFrame:
     df = df.copy()
 
     # Find the best description-like column
@@ -82,8 +147,7 @@ def categorize(df: pd.DataFrame) -> pd.DataFrame:
         raise KeyError("categorize(): no description column found in dataframe.")
 
     # FIX: must be "auto_category" (lowercase)
-    df["auto_category"] = df[desc_col].apply(assign_category)
-
-    return df
-
+    matcher = matcher or get_matcher()
+    df["auto_category"] = matcher.categorize_series(df[desc_col])
 
+    return apply_schema(df)
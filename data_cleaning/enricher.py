@@ -1,20 +1,69 @@
+import string
+import numpy as np
 import pandas as pd   # <-- ESTA LINEA FALTABA !
-def enrich(df):
+from .utils import transaction_ids
+from .schema import apply_schema, map_unique
+
+# Fields: {date} {type} {amount} plus any dataframe column.
+# A format spec ("{amount:.2f}") is applied column-wise with printf rules.
+RAG_TEMPLATE = (
+    "On {date}, a {type} of {amount:.2f} EUR "
+    "at '{description}' categorized as '{auto_category}'."
+)
+
+
+def _format_column(values, spec):
+    if not spec:
+        return pd.Series(values).astype(str).to_numpy(dtype=object)
+    return np.char.mod("%" + spec, np.asarray(values)).astype(object)
+
+
+def render_template(template, df, fields=None):
+    """
+    Build one string per row by concatenating whole columns, without
+    per-row Python. `fields` overrides / adds derived columns.
+    """
+    fields = fields or {}
+    out = np.full(len(df), "", dtype=object)
+
+    for literal, name, spec, conversion in string.Formatter().parse(template):
+        if literal:
+            out = out + literal
+        if name is None:
+            continue
+        if conversion:
+            raise ValueError(f"render_template(): conversions are not supported ({{{name}!{conversion}}})")
+
+        if name in fields:
+            values = fields[name]
+        elif name in df.columns:
+            values = df[name]
+        else:
+            raise KeyError(f"render_template(): unknown field '{name}'")
+
+        values = values.to_numpy() if isinstance(values, pd.Series) else values
+        out = out + _format_column(values, spec)
+
+    return pd.Series(out, index=df.index, dtype=object)
+
+
+def enrich(df, template=RAG_TEMPLATE):
     df = df.copy()
 
     df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["description"] = df["description"].fillna("No description").astype(str).str.strip()
-    df["auto_category"] = df["auto_category"].fillna("Otros").astype(str).str.strip()
+    df["description"] = map_unique(df["description"], lambda s: s.astype(str).str.strip(),
+                                   na="No description")
+    df["auto_category"] = map_unique(df["auto_category"], lambda s: s.astype(str).str.strip(),
+                                     na="Otros")
     df["amount_signed"] = pd.to_numeric(df["amount_signed"], errors="coerce").fillna(0)
 
-    def make_text(row):
-        tr_type = "expense" if row["amount_signed"] < 0 else "income"
-        amt = abs(row["amount_signed"])
-        date_str = row["date"].strftime("%Y-%m-%d")
-        return (
-            f"On {date_str}, a {tr_type} of {amt:.2f} EUR "
-            f"at '{row['description']}' categorized as '{row['auto_category']}'."
-        )
-
-    df["RAG_Text"] = df.apply(make_text, axis=1)
-    return df
+    amount = df["amount_signed"].to_numpy()
+    df["RAG_Text"] = render_template(template, df, {
+        "date": df["date"].dt.strftime("%Y-%m-%d").fillna("NaT"),
+        "type": np.where(amount < 0, "expense", "income"),
+        "amount": np.abs(amount),
+    })
+
+    # Stable content-derived id (used as the vectorstore document id)
+    df["tx_id"] = transaction_ids(df)
+    return apply_schema(df)
@@ -0,0 +1,85 @@
+# ============================================================
+# fingerprints.py — Persistent index of ingested transactions
+# ============================================================
+#
+# Bank exports overlap: every new download repeats weeks that were
+# already ingested. Each loaded row carries a `fingerprint` (see
+# utils.transaction_fingerprints, computed per export on the raw
+# amount), and this index remembers every fingerprint already in the
+# processed dataset. Lookups go through a pandas hash table, so checking
+# an export costs O(1) per incoming row whatever the index size.
+#
+# The index is a flat uint64 .npy file stored next to the dataset it
+# describes (data/Finance_Processed.fingerprints.npy).
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from .utils import transaction_fingerprints
+
+
+def index_path_for(dataset_path):
+    return os.path.splitext(dataset_path.rstrip("/\\"))[0] + ".fingerprints.npy"
+
+
+class FingerprintIndex:
+
+    def __init__(self, fingerprints=()):
+        values = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+        self._index = pd.Index(values)
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def values(self):
+        return self._index.to_numpy()
+
+    def unseen(self, fingerprints):
+        """Boolean mask: True for fingerprints not in the index yet."""
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        if not len(self._index):
+            return np.ones(len(fingerprints), dtype=bool)
+        return self._index.get_indexer(fingerprints) < 0
+
+    def add(self, fingerprints):
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        if len(fingerprints):
+            new = fingerprints[self.unseen(fingerprints)]
+            self._index = pd.Index(np.unique(np.concatenate([self.values, new])))
+
+    # ---------------------------------------------------------
+    # persistence
+    # ---------------------------------------------------------
+    @classmethod
+    def load(cls, path):
+        """The saved index, or an empty one when the file is missing."""
+        if not os.path.exists(path):
+            return cls()
+        return cls(np.load(path, allow_pickle=False))
+
+    def save(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.values, allow_pickle=False)
+        os.replace(tmp, path)
+        return path
+
+
+def drop_overlaps(frames):
+    """
+    Fingerprint each export and drop rows an earlier export already
+    contains. Returns (frames, dropped rows).
+    """
+    seen, out, dropped = FingerprintIndex(), [], 0
+    for frame in frames:
+        frame = frame.assign(fingerprint=transaction_fingerprints(frame, amount_col="amount"))
+        fresh = seen.unseen(frame["fingerprint"].to_numpy())
+        seen.add(frame["fingerprint"].to_numpy()[fresh])
+        dropped += int((~fresh).sum())
+        out.append(frame[fresh])
+    return out, dropped
@@ -1,72 +1,190 @@
 # ============================================================
-# fx_converter.py — Offline USD→EUR converter
+# fx_converter.py — Offline multi-currency → EUR converter
 # ============================================================
+#
+# fx_rates.csv holds one "Date" column plus one column per currency
+# (USD, GBP, ...). Each value is the number of currency units per EUR,
+# so amount_eur = amount / rate. The table is loaded once into sorted
+# NumPy arrays per currency and resolved with an as-of binary search.
 
-import pandas as pd
 import os
+import numpy as np
+import pandas as pd
+
+from .schema import apply_schema
 
 CACHE_PATH = "data/fx_rates.csv"
+BINARY_CACHE_PATH = "data/fx_rates.npz"
+BASE_CURRENCY = "EUR"
+
+# In-process memo: csv path -> (mtime_ns, size, table)
+_TABLES = {}
+
+
+# ============================================================
+# RATE TABLE
+# ============================================================
+class FXTable:
+    """Sorted per-currency (dates, rates) arrays with as-of lookup."""
+
+    def __init__(self, series):
+        # series: {currency: (dates datetime64[ns] sorted, rates float64)}
+        self.series = series
+
+    @property
+    def currencies(self):
+        return sorted(self.series)
+
+    def rates_asof(self, currency, dates):
+        """
+        Vectorized as-of lookup: for every date return the latest rate
+        published on or before it (NaN when none exists or rate is 0).
+        """
+        dates = pd.to_datetime(pd.Series(dates), errors="coerce").to_numpy("datetime64[ns]")
+        out = np.full(len(dates), np.nan)
+
+        if currency not in self.series:
+            return out
+
+        fx_dates, fx_rates = self.series[currency]
+        pos = np.searchsorted(fx_dates, dates, side="right") - 1
+
+        valid = (pos >= 0) & ~np.isnat(dates)
+        out[valid] = fx_rates[pos[valid]]
+        out[out == 0] = np.nan
+        return out
+
+    def to_eur(self, amounts, currency, dates):
+        amounts = pd.to_numeric(pd.Series(amounts), errors="coerce").to_numpy(float)
+        return amounts / self.rates_asof(currency, dates)
+
+
+def _table_from_frame(fx):
+    series = {}
+    dates = fx["Date"].to_numpy("datetime64[ns]")
+
+    for cur in fx.columns.drop("Date"):
+        rates = pd.to_numeric(fx[cur], errors="coerce").to_numpy(float)
+        keep = ~np.isnan(rates) & ~np.isnat(dates)
+        d, r = dates[keep], rates[keep]
+        order = np.argsort(d, kind="stable")
+        series[str(cur).strip().upper()] = (d[order], r[order])
+
+    return FXTable(series)
+
+
+def _read_binary_cache(path, mtime_ns, size):
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as npz:
+            if int(npz["src_mtime_ns"]) != mtime_ns or int(npz["src_size"]) != size:
+                return None
+            series = {
+                str(cur): (npz[f"dates__{cur}"], npz[f"rates__{cur}"])
+                for cur in npz["currencies"]
+            }
+        return FXTable(series)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _write_binary_cache(path, table, mtime_ns, size):
+    arrays = {
+        "src_mtime_ns": np.int64(mtime_ns),
+        "src_size": np.int64(size),
+        "currencies": np.array(table.currencies),
+    }
+    for cur, (d, r) in table.series.items():
+        arrays[f"dates__{cur}"] = d
+        arrays[f"rates__{cur}"] = r.astype(np.float64)
 
-def load_fx_rates():
-    if not os.path.exists(CACHE_PATH):
+    try:
+        np.savez_compressed(path, **arrays)
+    except OSError:
+        pass  # cache is best-effort
+
+
+def load_fx_table(path=CACHE_PATH, binary_path=BINARY_CACHE_PATH):
+    """Load the rate table, reusing the in-process memo or the .npz cache."""
+    if not os.path.exists(path):
         raise FileNotFoundError(
-            "FX rates file not found. Expected at data/fx_rates.csv"
+            f"FX rates file not found. Expected at {path}"
         )
 
-    fx = pd.read_csv(CACHE_PATH, parse_dates=["Date"])
-    fx["USD"] = pd.to_numeric(fx["USD"], errors="coerce")
-    fx = fx.dropna()
-    return fx
+    st = os.stat(path)
+    memo = _TABLES.get(path)
+    if memo and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+        return memo[2]
 
+    table = _read_binary_cache(binary_path, st.st_mtime_ns, st.st_size)
+    if table is None:
+        table = _table_from_frame(load_fx_rates(path))
+        _write_binary_cache(binary_path, table, st.st_mtime_ns, st.st_size)
 
-def usd_to_eur(amount, date, fx):
-    if amount is None or pd.isna(amount):
-        return None
+    _TABLES[path] = (st.st_mtime_ns, st.st_size, table)
+    return table
 
-    date = pd.to_datetime(date, errors="coerce")
-    if pd.isna(date):
-        return None
 
-    # Find closest previous rate
-    row = (
-        fx.loc[fx["Date"] <= date]
-        .sort_values("Date")
-        .tail(1)["USD"]
-    )
+def load_fx_rates(path=CACHE_PATH):
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"FX rates file not found. Expected at {path}"
+        )
+
+    fx = pd.read_csv(path, parse_dates=["Date"])
+    fx = fx.dropna(subset=["Date"])
+    return fx
 
-    if row.empty:
-        return None
 
-    rate = float(row.iloc[0])
-    if rate == 0:
+# ============================================================
+# SCALAR HELPER (kept for ad-hoc use)
+# ============================================================
+def usd_to_eur(amount, date, fx=None):
+    if amount is None or pd.isna(amount):
         return None
 
-    return float(amount) / rate
+    table = fx if isinstance(fx, FXTable) else load_fx_table()
+    value = table.to_eur([amount], "USD", [date])[0]
+    return None if np.isnan(value) else float(value)
 
 
-def convert_usd_to_eur(df):
+# ============================================================
+# DATAFRAME CONVERSION
+# ============================================================
+def convert_to_eur(df, fx=None):
+    """
+    Convert every non-EUR row to EUR using the `currency` column.
+    Rows without a rate on or before their date end up as NaN.
+    """
     df = df.copy()
 
-    if "source" not in df.columns:
-        return df
+    if "currency" not in df.columns:
+        return apply_schema(df)
+
+    currency = df["currency"].astype(str).str.strip().str.upper()
+    foreign = currency != BASE_CURRENCY
+
+    if not foreign.any():
+        df["currency"] = BASE_CURRENCY
+        return apply_schema(df)
+
+    table = fx if fx is not None else load_fx_table()
 
-    mask = df["source"] == "BG"
+    missing = sorted(set(currency[foreign]) - set(table.currencies))
+    if missing:
+        raise KeyError(f"convert_to_eur(): no FX rates for {missing} in {CACHE_PATH}")
 
-    if mask.sum() == 0:
-        df["currency"] = "EUR"
-        return df
+    amount = pd.to_numeric(df["amount"], errors="coerce").to_numpy(float).copy()
+    for cur in currency[foreign].unique():
+        rows = (currency == cur).to_numpy()
+        amount[rows] = table.to_eur(amount[rows], cur, df.loc[rows, "date"])
 
-    fx = load_fx_rates()
+    df["amount"] = amount
+    df["currency"] = BASE_CURRENCY
 
-    df["amount_eur"] = df.apply(
-        lambda row: usd_to_eur(row["amount"], row["date"], fx)
-        if row["source"] == "BG"
-        else row["amount"],
-        axis=1,
-    )
+    return apply_schema(df)
 
-    df["amount"] = df["amount_eur"]
-    df = df.drop(columns=["amount_eur"])
-    df["currency"] = "EUR"
 
-    return df
+# Backwards-compatible name used by runner.py
+convert_usd_to_eur = convert_to_eur
@@ -1,16 +1,131 @@
+import os
 import pandas as pd
-import re
+import numpy as np
+import openpyxl
+from concurrent.futures import ProcessPoolExecutor
+
+from .utils import clean_amount, clean_date, clean_description, clean_currency, collapse_debit_credit
+from .fingerprints import drop_overlaps
+from .schema import apply_schema
+
+CHUNK_SIZE = 5000
+HEADER_SCAN_ROWS = 50
+
+
+# =====================================================
+# BANK REGISTRY
+# =====================================================
+
+# bank code -> loader(path) returning a date-sorted frame with columns
+# date | description | amount | currency | source
+BANK_LOADERS = {}
+
+
+def register_bank(code):
+    """
+    Decorator registering a statement parser under a bank code.
+    Parsers must live at module level so worker processes can import them.
+    """
+    def decorator(fn):
+        BANK_LOADERS[code.upper()] = fn
+        return fn
+    return decorator
+
+
+def load_bank(bank, path):
+    try:
+        loader = BANK_LOADERS[bank.upper()]
+    except KeyError:
+        raise KeyError(
+            f"load_bank(): unknown bank '{bank}'. Registered: {sorted(BANK_LOADERS)}"
+        ) from None
+    return loader(path)
+
+
+def _call(loader, path):
+    return loader(path)
+
+
+# =====================================================
+# STREAMING EXCEL READER
+# =====================================================
+
+def _header_columns(row):
+    """Column names the way pd.read_excel would label them."""
+    columns, seen = [], {}
+    for i, v in enumerate(row):
+        name = str(v).strip() if v is not None and str(v).strip() else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def iter_excel_chunks(path, header_names, chunksize=CHUNK_SIZE, scan_rows=HEADER_SCAN_ROWS):
+    """
+    Stream a workbook's first sheet in read-only mode and yield raw
+    DataFrame chunks of at most `chunksize` rows.
+
+    The header row is detected as the first row (within `scan_rows`)
+    that contains every name in `header_names`, so banner lines above
+    the table no longer need a hard-coded skiprows.
+    """
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()   # some exports (BG) declare a bogus sheet size
+        rows = ws.iter_rows(values_only=True)
+
+        wanted = {h.strip() for h in header_names}
+        columns = None
+        for i, row in enumerate(rows):
+            cells = {str(v).strip() for v in row if v is not None}
+            if wanted <= cells:
+                columns = _header_columns(row)
+                break
+            if i >= scan_rows:
+                break
+
+        if columns is None:
+            raise ValueError(
+                f"{path}: header row with {sorted(wanted)} not found "
+                f"in the first {scan_rows} rows"
+            )
+
+        width = len(columns)
+        buffer = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            buffer.append(row)
+            if len(buffer) >= chunksize:
+                yield _frame(buffer, columns)
+                buffer = []
+
+        if buffer:
+            yield _frame(buffer, columns)
+    finally:
+        wb.close()
+
+
+def _frame(rows, columns):
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    # Empty cells arrive as None: use NaN like pd.read_excel does
+    return df.where(df.notna(), np.nan)
+
 
 # =====================================================
 # BG LOADER  (Banco General Panamá)
 # =====================================================
 
-def load_BG(path):
-    print("📘 Loading BG (clean version)...")
+BG_HEADER = ["Fecha", "Descripción"]
 
-    # 1. Load real table starting at row 8
-    df = pd.read_excel(path, skiprows=7, header=0)
 
+def clean_BG_chunk(df):
     # 2. Drop irrelevant columns (confirmed from notebook)
     df = df.drop(columns=[
         "Unnamed: 1",
@@ -24,21 +139,13 @@ def load_BG(path):
     # Fecha | Descripción | Débito | Crédito
 
     # 3. Collapse debit + credit into single amount
-    def collapse_amount(row):
-        if pd.notna(row.get("Débito")):
-            return row["Débito"]
-        if pd.notna(row.get("Crédito")):
-            return row["Crédito"]
-        return None
-
-    df["amount"] = df.apply(collapse_amount, axis=1)
-    df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+    df["amount"] = collapse_debit_credit(df["Débito"], df["Crédito"])
 
     # 4. Convert Fecha
-    df["Fecha"] = pd.to_datetime(df["Fecha"], errors="coerce")
+    df["Fecha"] = clean_date(df["Fecha"], dayfirst=False)
 
     # 5. Clean description
-    df["Descripción"] = df["Descripción"].astype(str).str.strip()
+    df["Descripción"] = clean_description(df["Descripción"])
 
     # 6. Add metadata
     df["currency"] = "USD"   # Later converted to EUR in convert_usd_to_eur
@@ -56,6 +163,27 @@ def load_BG(path):
     # 9. Remove invalid rows
     df = df.dropna(subset=["date", "amount"])
 
+    return df
+
+
+def iter_BG(path, chunksize=CHUNK_SIZE):
+    """Yield cleaned BG chunks as soon as they are parsed."""
+    for chunk in iter_excel_chunks(path, BG_HEADER, chunksize):
+        yield clean_BG_chunk(chunk)
+
+
+@register_bank("BG")
+def load_BG(path, chunksize=CHUNK_SIZE):
+    """
+    Whole BG statement as one date-sorted frame. Not streaming: only the
+    raw workbook rows are bounded by `chunksize`, while the cleaned
+    five-column chunks are kept and concatenated (see _concat).
+    """
+    print("📘 Loading BG (clean version)...")
+
+    # 1. Stream the real table (header row detected automatically)
+    df = _concat(iter_BG(path, chunksize))
+
     # 10. Sort chronologically
     df = df.sort_values("date").reset_index(drop=True)
 
@@ -66,40 +194,26 @@ def load_BG(path):
 # SD LOADER  (Santander España)
 # =====================================================
 
-def load_SD(path):
-    print("📕 Loading SD (clean version)...")
+SD_HEADER = ["Fecha operación", "Concepto", "Importe"]
 
-    # 1. Load real table starting at row 7
-    df = pd.read_excel(path, skiprows=6, header=0)
 
+def clean_SD_chunk(df):
     # Raw columns:
     # Fecha operación | Fecha valor | Concepto | Importe | Saldo | Divisa
 
     # ---- CONVERT FIRST ----
 
-    # 2. Convert amount
-    def clean_amount_raw(x):
-        if pd.isna(x):
-            return None
-        x = str(x)
-        x = x.replace("EUR", "").replace("€", "")
-        x = x.replace("−", "-")
-        x = x.replace(",", ".")
-        x = x.strip()
-        match = re.findall(r"-?\d+\.?\d*", x)
-        return float(match[0]) if match else None
+    # 2. Convert amount ("−2,00", "12,26 EUR", ...)
+    df["Importe"] = clean_amount(df["Importe"])
 
-    df["Importe"] = df["Importe"].apply(clean_amount_raw)
-    df["Importe"] = pd.to_numeric(df["Importe"], errors="coerce")
-
-    # 3. Convert date
-    df["Fecha operación"] = pd.to_datetime(df["Fecha operación"], dayfirst=True, errors="coerce")
+    # 3. Convert date (drops a "| hh:mm:ss" suffix when present)
+    df["Fecha operación"] = clean_date(df["Fecha operación"], dayfirst=True)
 
     # 4. Clean description
-    df["Concepto"] = df["Concepto"].astype(str).str.strip()
+    df["Concepto"] = clean_description(df["Concepto"])
 
     # 5. Clean currency
-    df["Divisa"] = df["Divisa"].astype(str).str.strip()
+    df["Divisa"] = clean_currency(df["Divisa"])
 
     # 6. Add metadata
     df["source"] = "SD"
@@ -123,23 +237,128 @@ def load_SD(path):
     # Filter invalid rows
     df = df.dropna(subset=["date", "amount"])
 
+    return df
+
+
+def iter_SD(path, chunksize=CHUNK_SIZE):
+    """Yield cleaned SD chunks as soon as they are parsed."""
+    for chunk in iter_excel_chunks(path, SD_HEADER, chunksize):
+        yield clean_SD_chunk(chunk)
+
+
+@register_bank("SD")
+def load_SD(path, chunksize=CHUNK_SIZE):
+    """Whole SD statement as one date-sorted frame (not streaming, see load_BG)."""
+    print("📕 Loading SD (clean version)...")
+
+    # 1. Stream the real table (header row detected automatically)
+    df = _concat(iter_SD(path, chunksize))
+
     # Sort
     df = df.sort_values("date").reset_index(drop=True)
 
     return df
 
 
+def _concat(chunks):
+    """
+    Materialize cleaned chunks. The rest of the pipeline needs every row
+    at once (date sort, overlap dedup across exports, running balance)
+    and worker processes return whole frames, so memory here grows with
+    the statement: streaming stops at the parse, which keeps openpyxl's
+    wide raw rows to one chunk at a time. Use iter_BG / iter_SD to
+    consume a statement chunk by chunk.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame(columns=["date", "description", "amount", "currency", "source"])
+    return pd.concat(chunks, ignore_index=True)
+
+
 # =====================================================
 # COMBINED LOADER
 # =====================================================
 
-def load_all(bg_path: str, sd_path: str) -> pd.DataFrame:
-    print("📥 Loading raw datasets...")
+def merge_sorted(frames, key="date"):
+    """
+    k-way merge of frames already sorted by `key` (pairwise, tree-shaped).
+    Each pairwise step places the right frame's rows with a binary search
+    instead of re-sorting; ties keep input order.
+    """
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame(columns=["date", "description", "amount", "currency", "source"])
 
-    bg = load_BG(bg_path)
-    sd = load_SD(sd_path)
+    while len(frames) > 1:
+        merged = [_merge_two(frames[i], frames[i + 1], key) for i in range(0, len(frames) - 1, 2)]
+        if len(frames) % 2:
+            merged.append(frames[-1])
+        frames = merged
 
-    df = pd.concat([bg, sd], ignore_index=True)
-    df = df.sort_values("date").reset_index(drop=True)
+    return frames[0].reset_index(drop=True)
 
-    return df
+
+def _merge_two(a, b, key):
+    n_a, n_b = len(a), len(b)
+    pos_b = np.searchsorted(a[key].to_numpy(), b[key].to_numpy(), side="right") + np.arange(n_b)
+
+    from_b = np.zeros(n_a + n_b, dtype=bool)
+    from_b[pos_b] = True
+
+    take = np.empty(n_a + n_b, dtype=np.int64)
+    take[from_b] = n_a + np.arange(n_b)
+    take[~from_b] = np.arange(n_a)
+
+    both = pd.concat([a, b], ignore_index=True)
+    return both.take(take).reset_index(drop=True)
+
+
+def _resolve_sources(sources):
+    # Legacy call style: load_all(bg_path, sd_path)
+    if len(sources) == 2 and all(isinstance(s, str) for s in sources):
+        return [("BG", sources[0]), ("SD", sources[1])]
+
+    resolved = []
+    for s in sources:
+        if isinstance(s, str) or len(s) != 2:
+            raise TypeError(f"load_all(): expected (bank, path) pairs, got {s!r}")
+        resolved.append((str(s[0]).upper(), s[1]))
+    return resolved
+
+
+def load_all(*sources, max_workers=None) -> pd.DataFrame:
+    """
+    Load any number of (bank, path) statements, e.g.
+    load_all(("BG", "data/BG.xlsx"), ("SD", "data/SD.xlsx")).
+
+    Files are parsed concurrently in worker processes and the per-file
+    sorted frames are k-way merged by date. The result is fully in
+    memory: each file is read in bounded chunks, but its cleaned rows are
+    materialized before the merge (see _concat). Every row gets a `fingerprint`;
+    rows repeated by an overlapping export of the same bank are dropped.
+    """
+    print("📥 Loading raw datasets...")
+
+    sources = _resolve_sources(sources)
+    for bank, _ in sources:
+        if bank not in BANK_LOADERS:
+            raise KeyError(
+                f"load_all(): unknown bank '{bank}'. Registered: {sorted(BANK_LOADERS)}"
+            )
+
+    workers = max_workers or min(len(sources), os.cpu_count() or 1)
+
+    if len(sources) <= 1 or workers <= 1:
+        frames = [load_bank(bank, path) for bank, path in sources]
+    else:
+        # Resolve parsers here: under spawn a fresh worker only knows the
+        # banks registered at import time, not ones added by the caller
+        loaders = [BANK_LOADERS[bank] for bank, _ in sources]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(_call, loaders, [path for _, path in sources]))
+
+    frames, dropped = drop_overlaps(frames)
+    if dropped:
+        print(f"🔁 Dropped {dropped} rows repeated across overlapping exports")
+
+    return apply_schema(merge_sorted(frames))
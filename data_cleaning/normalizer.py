@@ -1,19 +1,20 @@
+import numpy as np
 import pandas as pd   # <-- ESTA LINEA FALTABA !
+from .schema import apply_schema, map_unique
+
 def normalize(df):
     df = df.copy()
 
     # --- 1) Ensure correct dtypes ---
     df["date"] = pd.to_datetime(df["date"], errors="coerce")
     df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
-    df["description"] = df["description"].astype(str).str.strip()
+    df["description"] = map_unique(df["description"], lambda s: s.astype(str).str.strip())
 
     # --- 2) Create signed amount (already signed from BG/SD) ---
     df["amount_signed"] = df["amount"]
 
     # --- 3) Create transaction type ---
-    df["type"] = df["amount_signed"].apply(
-        lambda x: "income" if x >= 0 else "expense"
-    )
+    df["type"] = np.where(df["amount_signed"].to_numpy() >= 0, "income", "expense")
 
     # --- 4) Time features ---
     df["year"] = df["date"].dt.year
@@ -21,10 +22,12 @@ def normalize(df):
     df["month_name"] = df["date"].dt.month_name()
     df["dayofweek"] = df["date"].dt.day_name()
 
-    # --- 5) Sort ---
-    df = df.sort_values("date").reset_index(drop=True)
+    # --- 5) Sort + 6) Cumulative balance ---
+    return apply_schema(with_cumulative_balance(df))
 
-    # --- 6) Cumulative balance ---
-    df["cumulative_balance"] = df["amount_signed"].cumsum()
 
+def with_cumulative_balance(df):
+    """Sort by date and recompute the running balance (also after appending rows)."""
+    df = df.sort_values("date", kind="stable").reset_index(drop=True)
+    df["cumulative_balance"] = df["amount_signed"].cumsum()
     return df
@@ -0,0 +1,137 @@
+# ============================================================
+# schema.py — Declared dtypes of the processed dataset
+# ============================================================
+#
+# Every stage ends with apply_schema(), so repeated strings stay
+# categorical from load to storage instead of drifting back to object
+# dtype:
+#
+#   category        low-cardinality labels and the description
+#                   (a few hundred distinct merchants per 10k rows)
+#   int16 / int8    calendar fields
+#   float64         money (amount, amount_signed, cumulative_balance);
+#                   narrower floats would change converted amounts
+#   text            Arrow-backed strings for unique text (RAG_Text, tx_id)
+#
+# String transforms on categorical columns run once per category
+# (map_unique) and are broadcast back through the codes.
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    TEXT = "string[pyarrow]"
+except ImportError:   # plain object strings still work, just larger
+    TEXT = "object"
+
+SCHEMA = {
+    "date": "datetime64[ns]",
+    "description": "category",
+    "amount": "float64",
+    "currency": "category",
+    "source": "category",
+    "fingerprint": "uint64",
+    "amount_signed": "float64",
+    "type": "category",
+    "year": "int16",
+    "month": "int8",
+    "month_name": "category",
+    "dayofweek": "category",
+    "cumulative_balance": "float64",
+    "auto_category": "category",
+    "RAG_Text": TEXT,
+    "tx_id": TEXT,
+}
+
+CATEGORICAL_COLUMNS = [c for c, kind in SCHEMA.items() if kind == "category"]
+
+
+# ============================================================
+# CASTS
+# ============================================================
+def _integer(s, dtype):
+    if isinstance(s.dtype, pd.CategoricalDtype):   # hive partition keys
+        s = s.astype(str)
+    s = pd.to_numeric(s, errors="coerce")
+    info = np.iinfo(dtype)
+    if s.isna().any():
+        return s.astype(dtype.capitalize()) if s.min() >= info.min and s.max() <= info.max else s
+    if len(s) and (s.min() < info.min or s.max() > info.max):
+        return s
+    return s.astype(dtype)
+
+
+def cast_column(s, kind):
+    if kind == "float64":
+        return s if s.dtype == kind else pd.to_numeric(s, errors="coerce").astype(kind)
+    if kind == "category":
+        return s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+    if kind == "datetime64[ns]":
+        return s if pd.api.types.is_datetime64_any_dtype(s) else pd.to_datetime(s, errors="coerce")
+    if kind in ("int8", "int16", "int32"):
+        return s if s.dtype == kind else _integer(s, kind)
+    return s if s.dtype == kind else s.astype(kind)
+
+
+def apply_schema(df):
+    """Cast the declared columns present in `df`; other columns are left alone."""
+    casts = {}
+    for col, kind in SCHEMA.items():
+        if col in df.columns:
+            s = df[col]
+            cast = cast_column(s, kind)
+            if cast is not s:
+                casts[col] = cast
+    return df.assign(**casts) if casts else df
+
+
+def map_unique(s, fn, na=None):
+    """
+    Apply a vectorized Series transform to the distinct values of `s`
+    only and return a categorical aligned with `s`. Missing values
+    become `na` when given.
+    """
+    cat = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+    codes = cat.cat.codes.to_numpy()
+    categories = pd.Series(cat.cat.categories)
+    if na is not None and (codes < 0).any():
+        codes = np.where(codes < 0, len(categories), codes)
+        categories = pd.concat([categories.astype(object), pd.Series([na], dtype=object)],
+                               ignore_index=True)
+
+    mapped = pd.Series(fn(categories), dtype=object).to_numpy()
+    new_codes, uniques = pd.factorize(mapped)
+    codes = np.where(codes >= 0, new_codes[np.maximum(codes, 0)], -1) if len(mapped) else codes
+    return pd.Series(pd.Categorical.from_codes(codes, uniques), index=s.index, name=s.name)
+
+
+# ============================================================
+# MEMORY REPORT
+# ============================================================
+def memory_report(df):
+    """Deep memory per column plus totals (MB, bytes per row)."""
+    usage = df.memory_usage(deep=True, index=False)
+    total = int(usage.sum())
+    return {
+        "rows": len(df),
+        "mb": round(total / 2**20, 2),
+        "bytes_per_row": round(total / len(df), 1) if len(df) else 0.0,
+        "columns": {c: int(b) for c, b in usage.items()},
+        "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+    }
+
+
+def format_memory_report(reports):
+    """Text table for {stage: memory_report(...)}."""
+    lines = [f"{'stage':<12} {'rows':>10} {'MB':>9} {'B/row':>8}"]
+    for stage, r in reports.items():
+        lines.append(f"{stage:<12} {r['rows']:>10,} {r['mb']:>9.2f} {r['bytes_per_row']:>8.1f}")
+
+    last = list(reports.values())[-1] if reports else None
+    if last:
+        lines.append("")
+        lines.append(f"{'column':<20} {'dtype':<16} {'MB':>9}")
+        for col, size in sorted(last["columns"].items(), key=lambda x: -x[1]):
+            lines.append(f"{col:<20} {last['dtypes'][col]:<16} {size / 2**20:>9.2f}")
+    return "\n".join(lines)
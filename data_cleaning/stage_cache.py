@@ -0,0 +1,110 @@
+# ============================================================
+# stage_cache.py — Content-addressed cache for pipeline stages
+# ============================================================
+#
+# Each stage output is stored under a key derived from the hashes of
+# everything it depends on: input files, the previous stage key and the
+# source code of the stage itself. Keys chain, so editing one stage (or
+# the category rules) invalidates that stage and everything after it,
+# while earlier stages are loaded straight from disk.
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+
+import pandas as pd
+
+CACHE_DIR = "data/.stage_cache"
+
+# path -> (mtime_ns, size, digest)
+_FILE_DIGESTS = {}
+
+
+# ============================================================
+# HASHING
+# ============================================================
+def file_digest(path):
+    """sha256 of a file's bytes ("missing" when it does not exist)."""
+    if not os.path.exists(path):
+        return "missing"
+
+    st = os.stat(path)
+    memo = _FILE_DIGESTS.get(path)
+    if memo and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+        return memo[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+    digest = h.hexdigest()
+    _FILE_DIGESTS[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def code_digest(*objects):
+    """sha256 over the source code of modules / functions."""
+    h = hashlib.sha256()
+    for obj in objects:
+        h.update(inspect.getsource(obj).encode("utf-8"))
+    return h.hexdigest()
+
+
+def data_digest(obj):
+    """sha256 of a JSON-serialisable object (e.g. the category rules)."""
+    payload = json.dumps(obj, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stage_key(*parts):
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:24]
+
+
+# ============================================================
+# CACHE STORE
+# ============================================================
+class StageCache:
+    """One pickled DataFrame per stage; older keys are pruned on save."""
+
+    def __init__(self, cache_dir=CACHE_DIR, enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+
+    def path(self, stage, key):
+        return os.path.join(self.cache_dir, f"{stage}-{key}.pkl")
+
+    def has(self, stage, key):
+        return self.enabled and os.path.exists(self.path(stage, key))
+
+    def load(self, stage, key):
+        if not self.has(stage, key):
+            return None
+        try:
+            return pd.read_pickle(self.path(stage, key))
+        except Exception:
+            return None
+
+    def save(self, stage, key, df):
+        if not self.enabled:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        target = self.path(stage, key)
+        tmp = target + ".tmp"
+        df.to_pickle(tmp)
+        os.replace(tmp, target)
+
+        for old in glob.glob(os.path.join(self.cache_dir, f"{stage}-*.pkl")):
+            if old != target:
+                os.remove(old)
+
+    def clear(self):
+        for f in glob.glob(os.path.join(self.cache_dir, "*.pkl")):
+            os.remove(f)
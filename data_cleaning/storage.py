@@ -0,0 +1,97 @@
+# ============================================================
+# storage.py — Typed columnar storage for the processed dataset
+# ============================================================
+#
+# Finance_Processed is written as Parquet so datetime, categorical and
+# float dtypes survive the round trip and readers can project only the
+# columns they need. A CSV export is still available on request.
+
+import os
+import shutil
+
+import pandas as pd
+
+from .schema import apply_schema, CATEGORICAL_COLUMNS  # noqa: F401  (re-exported)
+
+PROCESSED_PATH = "data/Finance_Processed.parquet"
+CSV_PATH = "data/Finance_Processed.csv"
+
+PARTITION_COLUMNS = ["year", "month"]
+
+
+def save_processed(df, path=PROCESSED_PATH, partition=False, csv_path=None):
+    """
+    Write the processed dataset as Parquet (a year=/month= partitioned
+    directory when `partition` is set) and optionally export a CSV copy.
+    """
+    df = apply_schema(df)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Never leave a stale file/dir of the other layout behind
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+    if partition:
+        df.to_parquet(path, index=False, partition_cols=PARTITION_COLUMNS)
+    else:
+        df.to_parquet(path, index=False)
+
+    if csv_path:
+        df.to_csv(csv_path, index=False)
+
+    return path
+
+
+def resolve_path(path=None):
+    """Prefer the Parquet dataset, fall back to a legacy CSV."""
+    if path:
+        return path
+    if os.path.exists(PROCESSED_PATH):
+        return PROCESSED_PATH
+    if os.path.exists(CSV_PATH):
+        return CSV_PATH
+    raise FileNotFoundError(
+        f"Processed dataset missing: run runner.py to create {PROCESSED_PATH}"
+    )
+
+
+def _is_csv(path):
+    return path.lower().endswith(".csv")
+
+
+def processed_columns(path=None):
+    """Column names available in the stored dataset (no data is read)."""
+    path = resolve_path(path)
+    if _is_csv(path):
+        return list(pd.read_csv(path, nrows=0).columns)
+
+    import pyarrow.dataset as ds
+    return list(ds.dataset(path, partitioning="hive").schema.names)
+
+
+def load_processed(path=None, columns=None, filters=None):
+    """
+    Read the processed dataset, projecting only `columns` when given.
+    `filters` follows pyarrow's predicate syntax, e.g.
+    [("year", "=", 2025)], and is ignored for CSV.
+    """
+    path = resolve_path(path)
+
+    if _is_csv(path):
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in columns if c in header] if columns else None
+        df = pd.read_csv(path, usecols=usecols)
+        return apply_schema(df)
+
+    df = pd.read_parquet(path, columns=columns, filters=filters)
+
+    # Older files and partition keys (categoricals) are brought to the schema
+    df = apply_schema(df)
+
+    if os.path.isdir(path) and "date" in df.columns:
+        df = df.sort_values("date", kind="stable").reset_index(drop=True)
+
+    return df
@@ -1,79 +1,146 @@
 import pandas as pd
-import re
+
+from .schema import map_unique
+
+# Series-level parsing helpers shared by every bank loader. Everything
+# here works on whole columns with pandas string / NumPy kernels.
+
+CURRENCY_TOKENS = r"US\$|USD|EUR|€|\$"
+MINUS_SIGNS = r"[−–]"      # unicode minus / en dash used by some exports
+
 
 # ============================================================
 # SAFE STRING CLEANER
 # ============================================================
-def safe_strip(x):
-    """Safely strip strings."""
-    if isinstance(x, str):
-        return x.strip()
-    return x
+def safe_strip(s):
+    """Strip string cells, leave anything else untouched."""
+    stripped = s.str.strip() if _has_strings(s) else s
+    return stripped.where(stripped.notna(), s)
+
+
+def _has_strings(s):
+    return pd.api.types.infer_dtype(s, skipna=True) in ("string", "mixed", "mixed-integer", "empty")
 
 
 # ============================================================
 # DATE CLEANER
 # ============================================================
-def clean_date(x):
+def split_date_time(s):
+    """
+    Split "26/11/2025 | 16:38:45" style cells into (date, time) string
+    columns. Cells without a "|" get an empty time part.
+    """
+    parts = s.astype(str).str.split("|", n=1, expand=True)
+    date_part = parts[0].str.strip()
+    time_part = parts[1].str.strip().fillna("") if parts.shape[1] > 1 else pd.Series("", index=s.index)
+    return date_part, time_part
+
+
+def clean_date(s, dayfirst=True):
     """
     Normalize inconsistent date formats from Santander (SD) and BG.
     Accepts formats like:
     - 26/11/2025
     - 26/11/2025 | 16:38:45
     - 2025-11-26
+    - real Excel datetimes
     """
-    if pd.isna(x):
-        return pd.NaT
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+
+    if pd.api.types.infer_dtype(s, skipna=True) in ("datetime", "datetime64", "date"):
+        return pd.to_datetime(s, errors="coerce")
+
+    # String cells: drop the time part; other cells (datetimes) as they are
+    text = s.str.split("|", n=1).str[0].str.strip()
+    parsed = pd.to_datetime(text, dayfirst=dayfirst, errors="coerce")
 
-    if isinstance(x, str):
-        # Remove time if present
-        x = x.split("|")[0].strip()
+    others = s.where(text.isna() & s.notna())
+    if others.notna().any():
+        parsed = parsed.fillna(pd.to_datetime(others, errors="coerce"))
 
-    return pd.to_datetime(x, dayfirst=True, errors="coerce")
+    return parsed
 
 
 # ============================================================
 # AMOUNT CLEANER
 # ============================================================
-def clean_amount(x):
+def strip_currency(s):
+    """Remove currency codes / symbols and surrounding blanks."""
+    return s.str.replace(CURRENCY_TOKENS, "", regex=True).str.strip()
+
+
+def clean_amount(s, decimal="auto"):
     """
-    Normalize European and USD amounts:
-    - Converts commas to dots
+    Normalize European and USD amounts to float64:
     - Removes currency symbols
-    - Handles negative signs
-    - Converts empty / "−3,20" / "-3.20" / "3,20 EUR" etc.
+    - Handles unicode minus signs
+    - "3,20" / "-3.20" / "1.234,56" / "1,234.56" / "3,20 EUR"
+
+    decimal: "," (European), "." (US) or "auto". In auto mode the
+    right-most separator is the decimal one, unless a single kind of
+    separator appears several times (then it groups thousands).
+    Numeric cells are passed through unchanged.
     """
-    if pd.isna(x):
-        return None
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype("float64")
 
-    if isinstance(x, str):
-        x = x.replace("EUR", "").replace("$", "").replace("USD", "")
-        x = x.replace("−", "-")         # special minus
-        x = x.replace(",", ".")         # comma to dot
-        x = x.strip()
+    if not _has_strings(s):
+        return pd.to_numeric(s, errors="coerce").astype("float64")
 
-        # Extract numbers using regex
-        match = re.findall(r"-?\d+\.?\d*", x)
-        if match:
-            try:
-                return float(match[0])
-            except:
-                return None
+    stripped = strip_currency(s)   # NaN for every non-string cell
+    numeric = pd.to_numeric(s.where(stripped.isna() & s.notna()), errors="coerce")
 
-    if isinstance(x, (int, float)):
-        return float(x)
+    text = stripped.str.replace(MINUS_SIGNS, "-", regex=True).str.replace(r"\s+", "", regex=True)
+    token = text.str.extract(r"(-?\d[\d.,]*)", expand=False).str.rstrip(".,")
 
-    return None
+    if decimal == ",":
+        comma_is_decimal = pd.Series(True, index=s.index)
+    elif decimal == ".":
+        comma_is_decimal = pd.Series(False, index=s.index)
+    else:
+        last_comma = token.str.rfind(",")
+        last_dot = token.str.rfind(".")
+        n_comma = token.str.count(",")
+        n_dot = token.str.count(r"\.")
+        comma_is_decimal = (
+            ((last_comma > last_dot) & (n_dot > 0))
+            | ((n_dot == 0) & (n_comma == 1))
+            | ((n_comma == 0) & (n_dot > 1))
+        )
+
+    european = token.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    us = token.str.replace(",", "", regex=False)
+    parsed = pd.to_numeric(european.where(comma_is_decimal, us), errors="coerce")
+
+    return parsed.fillna(numeric).astype("float64")
+
+
+def collapse_debit_credit(debit, credit, negate_debit=False):
+    """
+    Merge separate Débito / Crédito columns into one signed amount:
+    debit when present, credit otherwise. `negate_debit` is for exports
+    that list debits as positive numbers.
+    """
+    debit = clean_amount(debit)
+    credit = clean_amount(credit)
+    if negate_debit:
+        debit = -debit.abs()
+    return debit.where(debit.notna(), credit)
 
 
 # ============================================================
 # TEXT NORMALIZER
 # ============================================================
-def clean_description(x):
-    """Normalize transaction descriptions."""
-    if pd.isna(x):
-        return ""
-    return str(x).strip()
+def clean_description(s, fill=None):
+    """Normalize transaction descriptions (missing -> `fill` or "nan")."""
+    if fill is not None:
+        s = s.fillna(fill)
+    return s.astype(str).str.strip()
+
+
+def clean_currency(s):
+    return s.astype(str).str.strip().str.upper()
 
 
 # ============================================================
@@ -107,3 +174,36 @@ def standardize_column_names(df):
 
     df = df.rename(columns=mapping)
     return df
+
+
+# ============================================================
+# STABLE TRANSACTION IDS / FINGERPRINTS
+# ============================================================
+def transaction_fingerprints(df, amount_col="amount_signed"):
+    """
+    uint64 hash of (day, normalized description, amount, source) plus an
+    occurrence counter, so legitimate same-day repeats of the same charge
+    keep distinct fingerprints. Inserting a row never changes the
+    fingerprint of any other row.
+    """
+    # Text keys are built once per distinct value; hashing a categorical
+    # gives the same result as hashing its values
+    day = pd.to_datetime(df["date"], errors="coerce").dt.normalize()
+    key = pd.DataFrame({
+        "date": map_unique(day, lambda s: s.dt.strftime("%Y-%m-%d")),
+        "description": map_unique(df["description"],
+                                  lambda s: s.astype(str).str.lower().str.split().str.join(" ")),
+        "amount": pd.to_numeric(df[amount_col], errors="coerce").round(2),
+        "source": map_unique(df["source"], lambda s: s.astype(str)) if "source" in df.columns else "",
+    }, index=df.index)
+
+    base = pd.util.hash_pandas_object(key, index=False)
+    key["occurrence"] = base.groupby(base).cumcount()
+
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+
+def transaction_ids(df, amount_col="amount_signed"):
+    """Content-derived ids ("tx_" + fingerprint in hex), stable across re-runs."""
+    hashed = transaction_fingerprints(df, amount_col)
+    return pd.Series(["tx_%016x" % h for h in hashed], index=df.index)
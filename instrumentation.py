@@ -0,0 +1,297 @@
+# ================================================================
+# instrumentation.py — Timed spans → JSON-lines trace + Prometheus
+# ================================================================
+#
+#   metrics = get_instrumentation()
+#   with metrics.span("normalize", kind="stage", memory=True) as span:
+#       span["rows_in"] = len(df)
+#       df = normalize(df)
+#       span["rows_out"] = len(df)
+#
+# Every finished span is appended to data/metrics/trace.jsonl (with
+# trace / parent ids, so pipeline runs and questions can be rebuilt as
+# trees). The trace rotates to trace.jsonl.1 past FINANCE_TRACE_MAX_MB,
+# so it stays below twice that size.
+#
+# Spans are also folded into running totals of this process, written in
+# the Prometheus text format to data/metrics/metrics-<role>-<pid>.prom
+# (role = the script: runner, dashboard, batch_questions...) at most
+# every FLUSH_SECONDS and at exit, ready for a node_exporter textfile
+# collector. One file per process keeps the dashboard, the CLI and
+# runner.py from overwriting each other's totals; only the latest
+# KEEP_PROM_FILES files of each role are kept.
+#
+# FINANCE_METRICS=0 disables everything; FINANCE_METRICS_DIR moves the files.
+
+import atexit
+import contextvars
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+METRICS_DIR = os.getenv("FINANCE_METRICS_DIR", "data/metrics")
+TRACE_FILE = "trace.jsonl"
+TRACE_MAX_MB = float(os.getenv("FINANCE_TRACE_MAX_MB", "10"))
+PROM_PATTERN = "metrics-{role}-{pid}.prom"
+FLUSH_SECONDS = 10.0
+KEEP_PROM_FILES = 5
+PREFIX = "finance"
+
+# Numeric span attributes exported as "last value" gauges
+GAUGE_ATTRS = {
+    "rows_in": "rows entering the span",
+    "rows_out": "rows leaving the span",
+    "documents": "documents returned",
+    "context_tokens": "estimated context tokens",
+    "frame_mb": "DataFrame deep memory footprint (MB)",
+    "peak_mb": "peak traced allocation (MB)",
+    "rss_peak_mb": "process resident set high-water mark (MB)",
+}
+# Attributes of "llm" spans accumulated as counters per model
+COUNTER_ATTRS = {
+    "prompt_tokens": "prompt tokens sent to the LLM",
+    "completion_tokens": "completion tokens generated by the LLM",
+    "cost_usd": "estimated LLM cost in USD",
+}
+
+_current = contextvars.ContextVar("finance_span", default=None)
+
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+
+def rss_peak_mb():
+    """Process RSS high-water mark, cheap enough for every span."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def process_role():
+    """Name of the running script ("runner", "dashboard"...)."""
+    role = os.getenv("FINANCE_METRICS_ROLE")
+    if not role:
+        script = sys.argv[0] if sys.argv else ""
+        role = os.path.splitext(os.path.basename(script))[0] if script not in ("", "-", "-c") else ""
+    role = "".join(c if c.isalnum() or c in "_-" else "_" for c in role).strip("-_")
+    return role or "python"
+
+
+def _labels(**labels):
+    inner = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class Instrumentation:
+
+    def __init__(self, directory=METRICS_DIR, enabled=True, role=None,
+                 trace_max_mb=TRACE_MAX_MB, flush_seconds=FLUSH_SECONDS):
+        self.directory = directory
+        self.enabled = enabled
+        self.role = role or process_role()
+        self.trace_max_bytes = int(trace_max_mb * 2**20)
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._spans = {}      # (kind, name) -> {"count", "errors", "seconds", "last"}
+        self._gauges = {}     # (attr, kind, name) -> value
+        self._counters = {}   # (attr, model) -> value
+        self._dirty = False
+        self._flushed = 0.0
+
+    @property
+    def trace_path(self):
+        return os.path.join(self.directory, TRACE_FILE)
+
+    @property
+    def prom_path(self):
+        return os.path.join(self.directory, PROM_PATTERN.format(role=self.role, pid=os.getpid()))
+
+    # ---------------------------------------------------------
+    # spans
+    # ---------------------------------------------------------
+    def _open(self, name, kind, parent=None, **attrs):
+        parent = parent if parent is not None else _current.get()
+        return {
+            "trace_id": parent["trace_id"] if parent else _new_id(),
+            "span_id": _new_id(),
+            "parent_id": parent["span_id"] if parent else None,
+            "name": name,
+            "kind": kind,
+            "start": round(time.time(), 6),
+            **attrs,
+        }
+
+    @contextmanager
+    def span(self, name, kind="stage", memory=False, **attrs):
+        """
+        Time the block. The yielded dict takes extra attributes (rows,
+        documents, tokens...). memory=True also records the peak traced
+        allocation of the block (tracemalloc; slower, meant for batch stages).
+        """
+        if not self.enabled:
+            yield dict(attrs)
+            return
+
+        span = self._open(name, kind, **attrs)
+        token = _current.set(span)
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif memory:
+            tracemalloc.reset_peak()
+
+        t0 = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span["seconds"] = round(time.perf_counter() - t0, 6)
+            if memory:
+                span["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+                if started_tracing:
+                    tracemalloc.stop()
+            span["rss_peak_mb"] = rss_peak_mb()
+            try:
+                _current.reset(token)
+            except ValueError:   # generator closed from another context
+                pass
+            self.record(span)
+
+    def child(self, parent, name, kind, seconds, **attrs):
+        """Record a span timed elsewhere (e.g. by LangChain callbacks)."""
+        if not self.enabled:
+            return None
+        span = self._open(name, kind, parent=parent, **attrs)
+        span["seconds"] = round(seconds, 6)
+        self.record(span)
+        return span
+
+    # ---------------------------------------------------------
+    # sinks
+    # ---------------------------------------------------------
+    def record(self, span):
+        key = (span["kind"], span["name"])
+        with self._lock:
+            totals = self._spans.setdefault(key, {"count": 0, "errors": 0, "seconds": 0.0, "last": 0.0})
+            totals["count"] += 1
+            totals["errors"] += "error" in span
+            totals["seconds"] += span.get("seconds", 0.0)
+            totals["last"] = span.get("seconds", 0.0)
+
+            for attr in GAUGE_ATTRS:
+                if isinstance(span.get(attr), (int, float)):
+                    self._gauges[(attr, *key)] = span[attr]
+            if span["kind"] == "llm":
+                model = span.get("model", "unknown")
+                for attr in COUNTER_ATTRS:
+                    if isinstance(span.get(attr), (int, float)):
+                        self._counters[(attr, model)] = self._counters.get((attr, model), 0) + span[attr]
+
+            self._dirty = True
+
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+                    size = f.tell()
+                if size > self.trace_max_bytes:
+                    os.replace(self.trace_path, self.trace_path + ".1")
+            except OSError:
+                pass   # metrics must never break the pipeline or a question
+
+        if time.monotonic() - self._flushed >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Rewrite this process's Prometheus file when totals changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            text = self._prometheus_text()
+            self._dirty = False
+            self._flushed = time.monotonic()
+        with self._write_lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = self.prom_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp, self.prom_path)
+                self._prune()
+            except OSError:
+                pass
+
+    def _prune(self):
+        """Drop the oldest files of finished processes of the same role."""
+        files = glob.glob(os.path.join(self.directory, PROM_PATTERN.format(role=self.role, pid="*")))
+        files = sorted((f for f in files if f != self.prom_path), key=os.path.getmtime, reverse=True)
+        for path in files[KEEP_PROM_FILES - 1:]:
+            os.remove(path)
+
+    def _prometheus_text(self):
+        lines = []
+        proc = {"role": self.role, "pid": os.getpid()}   # series unique across files
+
+        def block(metric, kind, help_text, samples):
+            lines.append(f"# HELP {PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+            lines.extend(f"{PREFIX}_{metric}{labels} {value:.6g}" for labels, value in samples)
+
+        spans = sorted(self._spans.items())
+        block("span_seconds_total", "counter", "Wall time spent in spans.",
+              [(_labels(kind=k, name=n, **proc), t["seconds"]) for (k, n), t in spans])
+        block("span_count_total", "counter", "Finished spans.",
+              [(_labels(kind=k, name=n, **proc), t["count"]) for (k, n), t in spans])
+        block("span_errors_total", "counter", "Spans that raised.",
+              [(_labels(kind=k, name=n, **proc), t["errors"]) for (k, n), t in spans])
+        block("span_last_seconds", "gauge", "Duration of the latest span.",
+              [(_labels(kind=k, name=n, **proc), t["last"]) for (k, n), t in spans])
+
+        for attr, help_text in GAUGE_ATTRS.items():
+            samples = [
+                (_labels(kind=k, name=n, **proc), v)
+                for (a, k, n), v in sorted(self._gauges.items()) if a == attr
+            ]
+            if samples:
+                block(f"span_{attr}", "gauge", f"Latest {help_text}.", samples)
+
+        for attr, help_text in COUNTER_ATTRS.items():
+            samples = [
+                (_labels(model=m, **proc), v)
+                for (a, m), v in sorted(self._counters.items()) if a == attr
+            ]
+            if samples:
+                block(f"llm_{attr}_total", "counter", f"Total {help_text}.", samples)
+
+        return "\n".join(lines) + "\n"
+
+
+_INSTANCE = None
+_INSTANCE_LOCK = threading.Lock()
+
+
+def get_instrumentation():
+    """Process-wide instance (disabled when FINANCE_METRICS=0)."""
+    global _INSTANCE
+    with _INSTANCE_LOCK:
+        if _INSTANCE is None:
+            _INSTANCE = Instrumentation(enabled=os.getenv("FINANCE_METRICS", "1") != "0")
+            if _INSTANCE.enabled:
+                atexit.register(_INSTANCE.flush)
+        return _INSTANCE
@@ -3,15 +3,17 @@
 # Adapted for new Finance_Processed.csv schema (RAG_Text field)
 # ================================================================
 
-import os
+import threading
 from dotenv import load_dotenv
-load_dotenv()
 
-# LangChain
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain.chains import RetrievalQA
-from langchain_core.prompts import ChatPromptTemplate
+# Only light modules at import time: LangChain, OpenAI and Chroma are
+# imported when the chain is first built (see get_finance_rag_chain),
+# so the dashboard renders its charts without loading them.
+from rag_engine.structured_query import try_structured_answer
+from rag_engine.answer_cache import AnswerCache, data_version, filter_signature
+from rag_engine.embedding_backends import get_embeddings, check_embeddings
+from data_cleaning.storage import resolve_path
+from instrumentation import get_instrumentation
 
 load_dotenv()
 
@@ -19,22 +21,44 @@ load_dotenv()
 # Global Config
 # --------------------------------------------------
 CHROMA_DIR = "data/chroma_finance_db"   # <-- this stays the same
+QUERY_VECTORS = 64   # recent question vectors shared by the cache lookup and retrieval
 
 
 # ================================================================
 # FUNCTION: Create a RAG chain for dashboard & CLI
 # ================================================================
-def get_finance_rag_chain():
+def get_finance_rag_chain(embeddings=None, context_tokens=None):
     """Creates and returns the RAG chain (LangChain 0.3.x compliant)."""
+    from langchain_openai import ChatOpenAI
+    from langchain_chroma import Chroma
+    from langchain_core.prompts import ChatPromptTemplate
+    from rag_engine.retrieval import FilteredRetriever, HybridRetriever
+    from rag_engine.lexical_index import LexicalIndex
+    from rag_engine.context_packing import PackedRetriever, FETCH_DOCS, CONTEXT_TOKENS
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    # Same backend as the build (FINANCE_EMBEDDINGS or manifest.json);
+    # vectors from another model would silently rank garbage
+    if embeddings is None:
+        embeddings = get_embeddings(directory=CHROMA_DIR)
+    check_embeddings(CHROMA_DIR, embeddings)
 
     vectorstore = Chroma(
         persist_directory=CHROMA_DIR,
         embedding_function=embeddings
     )
 
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 6})
+    # Date / category / bank / type mentioned in the question become
+    # metadata pre-filters; BM25 and vector rankings are fused when the
+    # lexical index has been built next to the collection
+    lexical = LexicalIndex.load(CHROMA_DIR)
+    if len(lexical):
+        candidates = HybridRetriever(vectorstore=vectorstore, lexical=lexical, k=FETCH_DOCS)
+    else:
+        candidates = FilteredRetriever(vectorstore=vectorstore, k=FETCH_DOCS)
+
+    # Over-fetched candidates → repeated merchants collapsed into one
+    # line, MMR for breadth, packed to the prompt token budget
+    retriever = PackedRetriever(base=candidates, k=6, max_tokens=context_tokens or CONTEXT_TOKENS)
 
     # ---------------------------
     # FIXED PROMPT FOR LC 0.3.x
@@ -78,7 +102,8 @@ El contexto recuperado son transacciones reales que debes tratar como verdad abs
     llm = ChatOpenAI(
         model="gpt-4.1-mini",
         temperature=0.15,
-        max_tokens=400
+        max_tokens=400,
+        stream_usage=True,    # token counts for streamed answers too
     )
 
     # ---------------------------
@@ -101,15 +126,239 @@ El contexto recuperado son transacciones reales que debes tratar como verdad abs
 
     return rag_chain
 
+
+# ================================================================
+# ROUTER: structured fast path in front of the RAG chain
+# ================================================================
+PHRASING_PROMPT = """
+Eres un asistente de finanzas personales. Redacta una respuesta breve y clara
+a la pregunta del usuario usando EXCLUSIVAMENTE estas cifras ya calculadas
+(son exactas, no las cambies ni inventes otras):
+
+{facts}
+"""
+
+
+class FinanceAssistant:
+    """
+    Same interface as the RAG chain (`invoke({"input": q})` returning a
+    dict with "answer" and "context", `stream` yielding partial dicts).
+    Aggregate questions are answered from rollups of the processed
+    dataset; everything else goes to the RAG chain, which is only built
+    when first needed.
+
+    RAG answers go through an optional AnswerCache keyed by the data
+    version, so repeated (or near-identical) questions skip retrieval
+    and the LLM until the dataset or the vectorstore changes.
+    """
+
+    def __init__(self, rag_chain=None, phrase_with_llm=False, cache=None):
+        self._rag_chain = rag_chain
+        self.phrase_with_llm = phrase_with_llm
+        self.cache = cache
+        self._phrasing_chain = None
+        self._embeddings = None
+        self._lock = threading.Lock()
+        self._embeddings_lock = threading.Lock()
+        self._warm_thread = None
+        self.metrics = get_instrumentation()
+
+    @property
+    def rag_chain(self):
+        # A question asked while warm_up() is running waits for it
+        # instead of building a second chain
+        with self._lock:
+            if self._rag_chain is None:
+                self._rag_chain = get_finance_rag_chain(embeddings=self.embeddings)
+        return self._rag_chain
+
+    def warm_up(self):
+        """Build the chain (imports, Chroma client, BM25 index) in the background."""
+        if self._warm_thread is None and self._rag_chain is None:
+            self._warm_thread = threading.Thread(
+                target=lambda: self.rag_chain, name="rag-warm-up", daemon=True
+            )
+            self._warm_thread.start()
+        return self._warm_thread
+
+    @property
+    def phrasing_chain(self):
+        if self._phrasing_chain is None:
+            from langchain_openai import ChatOpenAI
+            from langchain_core.prompts import ChatPromptTemplate
+            from langchain_core.output_parsers import StrOutputParser
+            llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0.15, max_tokens=200,
+                             stream_usage=True)
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", PHRASING_PROMPT),
+                ("user", "{input}"),
+            ])
+            self._phrasing_chain = prompt | llm | StrOutputParser()
+        return self._phrasing_chain
+
+    @property
+    def embeddings(self):
+        """
+        Query embedder of the chain. The vector computed for the semantic
+        cache lookup is remembered, so a cache miss does not embed the
+        question a second time in the retriever.
+        """
+        with self._embeddings_lock:
+            if self._embeddings is None:
+                from rag_engine.embeddings import PrecomputedEmbeddings
+                self._embeddings = PrecomputedEmbeddings(
+                    get_embeddings(directory=CHROMA_DIR), max_size=QUERY_VECTORS
+                )
+        return self._embeddings
+
+    def _embed(self, question):
+        vector = self.embeddings.embed_query(question)
+        self.embeddings.remember(question, vector)
+        return vector
+
+    # ---------------------------------------------------------
+    # answer cache
+    # ---------------------------------------------------------
+    def _lookup(self, question):
+        """Return (cached result or None, key to store a fresh answer under)."""
+        with self.metrics.span("answer_cache", kind="step") as span:
+            hit, key = self._cache_lookup(question)
+            span["hit"] = None if hit is None else hit["cache"]
+        return hit, key
+
+    def _cache_lookup(self, question):
+        version = data_version(resolve_path(), CHROMA_DIR)
+        self.cache.set_version(version)
+        filters = filter_signature(question)
+
+        hit = self.cache.get_exact(question, version, filters)
+        embedding = None
+        if hit is None:
+            embedding = self._embed(question)
+            hit = self.cache.get_semantic(embedding, version, filters)
+        if hit is not None:
+            from langchain_core.documents import Document
+            hit = {
+                "input": question,
+                "context": [Document(**d) for d in hit["context"]],
+                "answer": hit["answer"],
+                "cache": hit["cache"],
+            }
+        return hit, (version, filters, embedding)
+
+    def _store(self, question, key, answer, docs):
+        version, filters, embedding = key
+        context = [{"page_content": d.page_content, "metadata": dict(d.metadata)} for d in docs]
+        self.cache.put(question, version, filters, answer, context, embedding)
+
+    # ---------------------------------------------------------
+    # entry points
+    # ---------------------------------------------------------
+    def _traced(self, config, span):
+        """Config whose callbacks turn retrieval / LLM runs into child spans."""
+        if not self.metrics.enabled:
+            return config
+        from rag_engine.tracing import TraceCallbackHandler
+        config = dict(config or {})
+        callbacks = config.get("callbacks") or []
+        if isinstance(callbacks, list):
+            config["callbacks"] = callbacks + [TraceCallbackHandler(self.metrics, span)]
+        return config
+
+    def _structured(self, question):
+        with self.metrics.span("structured_query", kind="step") as span:
+            fast = try_structured_answer(question)
+            span["hit"] = fast is not None
+        return fast
+
+    def invoke(self, inputs, config=None):
+        question = inputs["input"]
+
+        with self.metrics.span("question", kind="query") as span:
+            fast = self._structured(question)
+            if fast is not None:
+                span["route"] = "structured"
+                answer = fast["answer"]
+                if self.phrase_with_llm:
+                    answer = self.phrasing_chain.invoke(
+                        {"facts": answer, "input": question}, self._traced(config, span)
+                    )
+                return {"input": question, "context": [], "answer": answer, "structured": fast}
+
+            if self.cache is None:
+                span["route"] = "rag"
+                return self.rag_chain.invoke(inputs, self._traced(config, span))
+
+            hit, key = self._lookup(question)
+            if hit is not None:
+                span["route"] = f"cache_{hit['cache']}"
+                return hit
+
+            span["route"] = "rag"
+            res = self.rag_chain.invoke(inputs, self._traced(config, span))
+            self._store(question, key, res["answer"], res.get("context", []))
+            return res
+
+    def stream(self, inputs, config=None):
+        """
+        Yield {"context": docs} as soon as retrieval finishes, then
+        {"answer": token} chunks while the LLM generates. Structured and
+        cached answers arrive as a single answer chunk.
+        """
+        question = inputs["input"]
+
+        with self.metrics.span("question", kind="query", streaming=True) as span:
+            fast = self._structured(question)
+            if fast is not None:
+                span["route"] = "structured"
+                yield {"context": [], "structured": fast}
+                if self.phrase_with_llm:
+                    phrasing = self.phrasing_chain.stream(
+                        {"facts": fast["answer"], "input": question}, self._traced(config, span)
+                    )
+                    for token in phrasing:
+                        yield {"answer": token}
+                else:
+                    yield {"answer": fast["answer"]}
+                return
+
+            key = None
+            if self.cache is not None:
+                hit, key = self._lookup(question)
+                if hit is not None:
+                    span["route"] = f"cache_{hit['cache']}"
+                    yield {"context": hit["context"], "cache": hit["cache"]}
+                    yield {"answer": hit["answer"]}
+                    return
+
+            span["route"] = "rag"
+            tokens, docs = [], []
+            for chunk in self.rag_chain.stream(inputs, self._traced(config, span)):
+                if "context" in chunk:
+                    docs = chunk["context"]
+                    yield {"context": docs}
+                if chunk.get("answer"):
+                    tokens.append(chunk["answer"])
+                    yield {"answer": chunk["answer"]}
+
+            if key is not None:
+                self._store(question, key, "".join(tokens), docs)
+
+
+def get_finance_assistant(phrase_with_llm=False, use_cache=True):
+    """Router + RAG chain used by the dashboard and the terminal mode."""
+    cache = AnswerCache() if use_cache else None
+    return FinanceAssistant(phrase_with_llm=phrase_with_llm, cache=cache)
+
 # ================================================================
 # OPTIONAL TERMINAL MODE
 if __name__ == "__main__":
 
-    print("🔵 Loading Chroma DB with OpenAI embeddings...")
+    print("🔵 Loading Chroma DB...")
     print("🤖 Loading LLM: gpt-4.1-mini")
     print("\n💬 Personal Finance RAG ready.\n")
 
-    qa = get_finance_rag_chain()
+    qa = get_finance_assistant()
 
     while True:
         q = input("🧠 Ask about your finances: ")
@@ -119,7 +368,11 @@ if __name__ == "__main__":
             break
 
         try:
-            res = qa.invoke({"input": q})   # <-- FIXED
-            print(f"💡 {res['answer']}\n")   # <-- FIXED
+            # Tokens are printed as they arrive
+            print("💡 ", end="", flush=True)
+            for chunk in qa.stream({"input": q}):
+                if "answer" in chunk:
+                    print(chunk["answer"], end="", flush=True)
+            print("\n")
         except Exception as e:
             print(f"⚠️ Error: {e}\n")
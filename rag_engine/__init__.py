@@ -0,0 +1,17 @@
+# Re-exports are resolved on first access so that importing a light
+# submodule (structured_query, answer_cache...) does not load LangChain.
+_EXPORTS = {
+    "EmbeddingCache": ".embeddings",
+    "PrecomputedEmbeddings": ".embeddings",
+    "embed_texts": ".embeddings",
+    "add_embeddings": ".embeddings",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        from importlib import import_module
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
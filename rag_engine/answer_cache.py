@@ -0,0 +1,218 @@
+# ============================================================
+# answer_cache.py — Versioned answer cache for the RAG assistant
+# ============================================================
+#
+# Answers are stored in SQLite (so they survive Streamlit restarts)
+# under the normalized question, the data version and the resolved
+# filters of the question ("last month" → concrete dates). Two tiers:
+#
+#   exact     same normalized question, same data version
+#   semantic  a cached question whose embedding has cosine similarity
+#             >= threshold and the same resolved filters
+#
+# Entries from an older data version are purged as soon as the pipeline
+# or the vectorstore changes. Size is bounded with TTL + LRU eviction.
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from data_cleaning.stage_cache import file_digest
+from .structured_query import parse_filters
+
+CACHE_PATH = "data/answer_cache.sqlite"
+MANIFEST_FILE = "manifest.json"
+MAX_ENTRIES = 500
+TTL_SECONDS = 7 * 24 * 3600
+SIMILARITY_THRESHOLD = 0.95
+
+
+# ============================================================
+# KEYS
+# ============================================================
+def normalize_question(question):
+    text = unicodedata.normalize("NFKD", str(question).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _tree_signature(path):
+    """Cheap fingerprint of a partitioned dataset: names, sizes, mtimes."""
+    if not os.path.exists(path):
+        return "missing"
+
+    h = hashlib.sha256()
+    for root, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            h.update(f"{os.path.relpath(full, path)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+def data_version(dataset_path, chroma_dir):
+    """
+    Changes whenever the processed dataset or the vectorstore content
+    changes (the build writes a content hash into manifest.json).
+    """
+    if os.path.isfile(dataset_path):
+        dataset = file_digest(dataset_path)
+    else:
+        dataset = _tree_signature(dataset_path)
+
+    store = "missing"
+    manifest = os.path.join(chroma_dir, MANIFEST_FILE)
+    if os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            store = json.load(f).get("version", "missing")
+
+    payload = f"{dataset}|{store}"
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def filter_signature(question, today=None):
+    f = parse_filters(question, today=today)
+    return json.dumps({
+        "start": str(f["start"]), "end": str(f["end"]),
+        "categories": sorted(f["categories"]), "sources": sorted(f["sources"]),
+        "type": f["type"],
+    }, sort_keys=True)
+
+
+# ============================================================
+# CACHE
+# ============================================================
+class AnswerCache:
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES,
+                 ttl=TTL_SECONDS, threshold=SIMILARITY_THRESHOLD):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._version = None
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Streamlit may call from different threads: the connection is
+        # shared, and every use of it holds the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY,"
+            " version TEXT NOT NULL,"
+            " filters TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " context TEXT,"
+            " embedding BLOB,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def _key(self, norm, version, filters):
+        return hashlib.sha256(f"{norm}|{version}|{filters}".encode()).hexdigest()
+
+    def set_version(self, version):
+        """Drop every answer computed against another data version."""
+        with self._lock:
+            if version != self._version:
+                self.conn.execute("DELETE FROM answers WHERE version != ?", (version,))
+                self.conn.commit()
+                self._version = version
+
+    def _expire(self):
+        self.conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+
+    def _touch(self, key):
+        self.conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+
+    def get_exact(self, question, version, filters):
+        key = self._key(normalize_question(question), version, filters)
+        with self._lock:
+            self._expire()
+            row = self.conn.execute(
+                "SELECT answer, context FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.conn.commit()
+                return None
+            self._touch(key)
+        return {"answer": row[0], "context": json.loads(row[1] or "[]"), "cache": "exact"}
+
+    def get_semantic(self, embedding, version, filters):
+        if embedding is None:
+            return None
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, answer, context, embedding FROM answers "
+                "WHERE version = ? AND filters = ? AND embedding IS NOT NULL",
+                (version, filters),
+            ).fetchall()
+        if not rows:
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32)
+        matrix = np.vstack([np.frombuffer(r[3], dtype=np.float32) for r in rows])
+        if matrix.shape[1] != query.shape[0]:
+            return None
+
+        sims = matrix @ query / (
+            np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12
+        )
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+
+        key, answer, context, _ = rows[best]
+        with self._lock:
+            self._touch(key)
+        return {
+            "answer": answer,
+            "context": json.loads(context or "[]"),
+            "cache": "semantic",
+            "similarity": float(sims[best]),
+        }
+
+    def put(self, question, version, filters, answer, context=None, embedding=None):
+        now = time.time()
+        blob = None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+        row = (
+            self._key(normalize_question(question), version, filters),
+            version, filters, question, answer,
+            json.dumps(context or [], ensure_ascii=False), blob, now, now,
+        )
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(key, version, filters, question, answer, context, embedding, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            # LRU eviction beyond max_entries
+            self.conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                " SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM answers")
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
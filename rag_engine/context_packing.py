@@ -0,0 +1,185 @@
+# ============================================================
+# context_packing.py — Token-budgeted, diverse RAG context
+# ============================================================
+#
+# Recurring charges (Spotify every month, Mercadona every week) used to
+# fill all six context slots with near-identical sentences. The packer
+# sits between the retriever and the prompt:
+#
+#   1. over-fetch candidates from the base retriever (FETCH_DOCS)
+#   2. collapse transactions of the same merchant and type into one
+#      aggregated line ("12 charges of 10.99 EUR at Spotify between ...")
+#   3. order the rest by maximal marginal relevance (retrieval rank vs
+#      token overlap with what is already selected)
+#   4. keep summaries first, then add units until `k` or the token
+#      budget is reached
+#
+# Tokens are estimated from characters (no tokenizer download needed).
+
+import os
+import re
+from typing import Any
+
+import pandas as pd
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .lexical_index import tokenize
+from .summaries import TRANSACTION, SUMMARY_TYPES, merchant_names
+
+TRANSACTION_GROUP = "transaction_group"
+
+DEFAULT_K = 6
+FETCH_DOCS = 24
+CONTEXT_TOKENS = int(os.getenv("FINANCE_CONTEXT_TOKENS", "1500"))
+MMR_LAMBDA = 0.7
+CHARS_PER_TOKEN = 4
+
+DESCRIPTION_RE = re.compile(r" at '(.*)' categorized as ")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _day(date_int):
+    d = int(date_int or 0)
+    return f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}" if d else "?"
+
+
+def merchant_of(doc):
+    """Merchant label stored at build time, else parsed from RAG_Text (older builds)."""
+    merchant = doc.metadata.get("merchant")
+    if merchant:
+        return merchant
+    match = DESCRIPTION_RE.search(doc.page_content)
+    if not match:
+        return None
+    return merchant_names(pd.Series([match.group(1)])).iloc[0] or None
+
+
+# ============================================================
+# NEAR-DUPLICATE COLLAPSE
+# ============================================================
+def group_document(members, merchant):
+    """One aggregated line for several transactions at the same merchant."""
+    metas = [m.metadata for m in members]
+    amounts = [abs(float(m.get("amount_signed", 0.0))) for m in metas]
+    dates = sorted(int(m.get("date_int", 0) or 0) for m in metas)
+    income = metas[0].get("type") == "income"
+    category = metas[0].get("auto_category", "")
+    n, total = len(members), sum(amounts)
+
+    if len({round(a, 2) for a in amounts}) == 1:
+        what = f"{n} {'payments' if income else 'charges'} of {amounts[0]:.2f} EUR"
+    else:
+        what = (f"{n} {'incomes' if income else 'expenses'} of "
+                f"{min(amounts):.2f}–{max(amounts):.2f} EUR")
+    text = (f"{what} {'from' if income else 'at'} '{merchant}' between {_day(dates[0])} "
+            f"and {_day(dates[-1])} (total {total:.2f} EUR, categorized as '{category}').")
+
+    return Document(page_content=text, metadata={
+        "doc_type": TRANSACTION_GROUP,
+        "merchant": merchant,
+        "count": n,
+        "type": metas[0].get("type"),
+        "auto_category": category,
+        "amount_signed": round(total if income else -total, 2),
+        "date_int": dates[-1],
+        "tx_ids": [m.id for m in members if m.id],
+    })
+
+
+def collapse_duplicates(docs):
+    """
+    Merge transactions sharing merchant and type into a group document
+    placed at the rank of its best member. Other documents are untouched.
+    """
+    units, groups = [], {}
+    for doc in docs:
+        merchant = merchant_of(doc) if doc.metadata.get("doc_type", TRANSACTION) == TRANSACTION else None
+        if merchant is None:
+            units.append((None, [doc]))
+            continue
+        key = (merchant.lower(), doc.metadata.get("type"))
+        if key in groups:
+            groups[key].append(doc)
+        else:
+            groups[key] = [doc]
+            units.append((merchant, groups[key]))
+
+    return [
+        members[0] if len(members) == 1 else group_document(members, merchant)
+        for merchant, members in units
+    ]
+
+
+# ============================================================
+# MMR + BUDGET
+# ============================================================
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def mmr_order(docs, lambda_mult=MMR_LAMBDA):
+    """
+    Reorder by maximal marginal relevance. Relevance is the retrieval
+    rank (best = 1.0), redundancy the token Jaccard similarity with the
+    documents already picked.
+    """
+    n = len(docs)
+    tokens = [set(tokenize(d.page_content)) for d in docs]
+    relevance = [1.0 - i / n for i in range(n)]
+    redundancy = [0.0] * n
+
+    order, left = [], list(range(n))
+    while left:
+        best = max(left, key=lambda i: lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy[i])
+        order.append(best)
+        left.remove(best)
+        for i in left:
+            redundancy[i] = max(redundancy[i], _jaccard(tokens[i], tokens[best]))
+    return [docs[i] for i in order]
+
+
+def pack_context(docs, k=DEFAULT_K, max_tokens=CONTEXT_TOKENS, lambda_mult=MMR_LAMBDA):
+    """
+    Summaries (already one per period / category) first, then up to `k`
+    collapsed, MMR-ordered transaction units, all within `max_tokens`.
+    """
+    summaries = [d for d in docs if d.metadata.get("doc_type") in SUMMARY_TYPES]
+    others = [d for d in docs if d.metadata.get("doc_type") not in SUMMARY_TYPES]
+
+    packed, used, units = [], 0, 0
+    for doc in summaries:
+        cost = estimate_tokens(doc.page_content)
+        if used + cost <= max_tokens:
+            packed.append(doc)
+            used += cost
+
+    for doc in mmr_order(collapse_duplicates(others), lambda_mult):
+        if units >= k:
+            break
+        cost = estimate_tokens(doc.page_content)
+        if used + cost > max_tokens:
+            continue   # a shorter unit may still fit
+        packed.append(doc)
+        used += cost
+        units += 1
+    return packed
+
+
+class PackedRetriever(BaseRetriever):
+    """Over-fetches from `base` and returns the packed context (see module docstring)."""
+
+    base: Any
+    k: int = DEFAULT_K
+    max_tokens: int = CONTEXT_TOKENS
+    lambda_mult: float = MMR_LAMBDA
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        docs = self.base.invoke(query, config={"callbacks": run_manager.get_child()})
+        return pack_context(docs, self.k, self.max_tokens, self.lambda_mult)
@@ -0,0 +1,124 @@
+# ============================================================
+# embedding_backends.py — Pluggable embedding backend selection
+# ============================================================
+#
+#   openai   OpenAIEmbeddings (text-embedding-3-small), network + cost
+#   local    HashingEmbeddings: CPU-only hashed n-grams, offline
+#   fake     deterministic random vectors (tests only)
+#
+# The backend is resolved as: explicit argument > FINANCE_EMBEDDINGS >
+# whatever built the collection (manifest.json) > openai. The build
+# records backend, model and dimension in the manifest, and queries
+# refuse to run with a different embedder, because vectors from two
+# models are not comparable even when their dimensions happen to match.
+#
+# Light module: backends are imported only when instantiated.
+
+import json
+import os
+
+from .answer_cache import MANIFEST_FILE
+
+BACKENDS = ("openai", "local", "fake")
+DEFAULT_BACKEND = "openai"
+EMBEDDING_MODEL = "text-embedding-3-small"
+FAKE_DIM = 1536
+
+# Output sizes of the OpenAI models (saves a probe request)
+KNOWN_DIMS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class EmbeddingMismatchError(ValueError):
+    """The configured embedder cannot query the collection on disk."""
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def stored_embedding(directory):
+    """{"backend", "model", "dim"} of the collection, or None (older builds)."""
+    return read_manifest(directory).get("embedding")
+
+
+def resolve_backend(backend=None, directory=None):
+    backend = backend or os.getenv("FINANCE_EMBEDDINGS")
+    if not backend and directory:
+        backend = (stored_embedding(directory) or {}).get("backend")
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r} (choose from {', '.join(BACKENDS)})")
+    return backend
+
+
+def get_embeddings(backend=None, directory=None, dim=None):
+    """
+    Embedder for `backend` (see module docstring for how it is resolved).
+    The local backend reuses the collection's dimension unless `dim` or
+    FINANCE_EMBEDDING_DIM says otherwise.
+    """
+    backend = resolve_backend(backend, directory)
+
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=EMBEDDING_MODEL)
+
+    if backend == "fake":
+        from .embeddings import get_offline_embeddings
+        return get_offline_embeddings(size=FAKE_DIM)
+
+    from .local_embeddings import HashingEmbeddings, DEFAULT_DIM
+    stored = stored_embedding(directory) if directory else None
+    if dim is None and os.getenv("FINANCE_EMBEDDING_DIM"):
+        dim = int(os.getenv("FINANCE_EMBEDDING_DIM"))
+    if dim is None and stored and stored.get("backend") == "local":
+        dim = stored.get("dim")
+    return HashingEmbeddings(dim=dim or DEFAULT_DIM)
+
+
+def backend_name(embeddings):
+    embeddings = getattr(embeddings, "base", embeddings)   # PrecomputedEmbeddings
+    name = type(embeddings).__name__
+    if name == "HashingEmbeddings":
+        return "local"
+    if name == "OpenAIEmbeddings":
+        return "openai"
+    if name == "DeterministicFakeEmbedding":
+        return "fake"
+    return name
+
+
+def embedding_info(embeddings):
+    """What the manifest records about the embedder that built a collection."""
+    from .embeddings import model_name
+
+    base = getattr(embeddings, "base", embeddings)
+    model = model_name(base)
+    dim = getattr(base, "dim", None) or getattr(base, "size", None) or KNOWN_DIMS.get(model)
+    if dim is None:
+        dim = len(base.embed_query("dimension probe"))
+    return {"backend": backend_name(base), "model": model, "dim": int(dim)}
+
+
+def check_embeddings(directory, embeddings):
+    """Raise EmbeddingMismatchError when `embeddings` did not build the collection."""
+    stored = stored_embedding(directory)
+    if not stored:
+        return
+    current = embedding_info(embeddings)
+    if (stored.get("model"), stored.get("dim")) != (current["model"], current["dim"]):
+        raise EmbeddingMismatchError(
+            f"The collection in {directory} was built with {stored.get('backend')} "
+            f"{stored.get('model')} ({stored.get('dim')} dims) but the query embedder is "
+            f"{current['backend']} {current['model']} ({current['dim']} dims). "
+            f"Set FINANCE_EMBEDDINGS={stored.get('backend')} or rebuild with "
+            f"`python build_chroma_vectorstore.py --rebuild --backend {current['backend']}`."
+        )
@@ -0,0 +1,264 @@
+# ============================================================
+# embeddings.py — Batched, concurrent, cached embedding stage
+# ============================================================
+#
+# Texts are deduplicated, looked up in a local SQLite cache keyed by
+# (model, sha256(text)), and only the misses are sent to the embedding
+# model in fixed-size batches across a bounded thread pool. Rate-limit
+# and transient errors are retried with exponential backoff.
+
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+CACHE_PATH = "data/embedding_cache.sqlite"
+BATCH_SIZE = 256
+MAX_WORKERS = 4
+MAX_RETRIES = 6
+INSERT_BATCH_SIZE = 5000
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def model_name(embeddings):
+    """Identifier used to key the cache (model names never mix vectors)."""
+    for attr in ("model", "model_name"):
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    size = getattr(embeddings, "size", None)
+    name = type(embeddings).__name__
+    return f"{name}-{size}" if size else name
+
+
+def get_offline_embeddings(size=1536):
+    """Deterministic stand-in for OpenAIEmbeddings (no network, for tests)."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    return DeterministicFakeEmbedding(size=size)
+
+
+# ============================================================
+# PERSISTENT CACHE
+# ============================================================
+class EmbeddingCache:
+    """float32 vectors stored as blobs, keyed by (model, text hash)."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self.conn.commit()
+
+    def get_many(self, model, hashes):
+        found = {}
+        hashes = list(hashes)
+        for start in range(0, len(hashes), 900):   # SQLite variable limit
+            chunk = hashes[start:start + 900]
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT text_hash, vector FROM embeddings "
+                f"WHERE model = ? AND text_hash IN ({marks})",
+                [model, *chunk],
+            )
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model, items):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+            [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items],
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+# ============================================================
+# PRECOMPUTED QUERY VECTORS
+# ============================================================
+class PrecomputedEmbeddings(Embeddings):
+    """
+    Serves query vectors computed up front in a single batch (e.g. for
+    every question of a report) or remembered after another use (the
+    answer cache lookup); unknown texts go to the wrapped model.
+    """
+
+    def __init__(self, base, texts=(), vectors=(), max_size=None):
+        self.base = base
+        self.vectors = {t: list(map(float, v)) for t, v in zip(texts, vectors)}
+        self.model = model_name(base)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_queries(cls, base, queries, **kwargs):
+        queries = list(dict.fromkeys(queries))
+        vectors = embed_texts(queries, base, query=True, **kwargs) if queries else []
+        return cls(base, queries, vectors)
+
+    def remember(self, text, vector):
+        """Serve `vector` for `text` from now on; the oldest go beyond max_size."""
+        with self._lock:
+            self.vectors.pop(text, None)
+            self.vectors[text] = list(map(float, vector))
+            while self.max_size is not None and len(self.vectors) > self.max_size:
+                del self.vectors[next(iter(self.vectors))]
+
+    def embed_query(self, text):
+        vector = self.vectors.get(text)
+        if vector is not None:
+            return vector
+        return self.base.embed_query(text)
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+
+# ============================================================
+# RETRIES
+# ============================================================
+def _status_code(exc):
+    code = getattr(exc, "status_code", None)
+    if code is None and getattr(exc, "response", None) is not None:
+        code = getattr(exc.response, "status_code", None)
+    return code
+
+
+def is_retryable(exc):
+    name = type(exc).__name__
+    code = _status_code(exc)
+    if code == 429 or "RateLimit" in name:
+        return True
+    if code is not None and code >= 500:
+        return True
+    return any(k in name for k in ("Timeout", "Connection", "ServiceUnavailable"))
+
+
+def retry_delay(exc, attempt, base_delay=1.0, max_delay=60.0):
+    """Honour Retry-After when the API sends it, else backoff + jitter."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    return min(base_delay * (2 ** attempt), max_delay) * (0.5 + random.random() / 2)
+
+
+# Backends whose embed_query(t) is exactly embed_documents([t])[0]
+SYMMETRIC_BACKENDS = {"OpenAIEmbeddings"}
+
+
+def embed_queries(embeddings, texts):
+    """
+    Query-side vectors for `texts`: the backend's batched embed_queries
+    when it has one, a single embed_documents call for symmetric backends,
+    else one embed_query per text (queries may be embedded differently).
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if type(embeddings).__name__ in SYMMETRIC_BACKENDS:
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(t) for t in texts]
+
+
+def _embed_batch(embeddings, texts, max_retries, base_delay, query=False):
+    for attempt in range(max_retries + 1):
+        try:
+            return embed_queries(embeddings, texts) if query else embeddings.embed_documents(texts)
+        except Exception as exc:
+            if attempt >= max_retries or not is_retryable(exc):
+                raise
+            time.sleep(retry_delay(exc, attempt, base_delay))
+
+
+# ============================================================
+# EMBEDDING STAGE
+# ============================================================
+def embed_texts(
+    texts,
+    embeddings,
+    cache=None,
+    batch_size=BATCH_SIZE,
+    max_workers=MAX_WORKERS,
+    max_retries=MAX_RETRIES,
+    base_delay=1.0,
+    query=False,
+):
+    """
+    Embed `texts` and return a float32 matrix aligned with the input.
+    Identical texts are embedded once; cached vectors are reused.
+    query=True embeds them as search queries (see embed_queries), cached
+    apart from document vectors.
+    """
+    texts = [str(t) for t in texts]
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    model = model_name(embeddings) + (":query" if query else "")
+    unique = {}
+    for t in texts:
+        unique.setdefault(text_sha256(t), t)
+
+    vectors = cache.get_many(model, unique) if cache is not None else {}
+    misses = [(h, t) for h, t in unique.items() if h not in vectors]
+
+    if misses:
+        batches = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+        print(f"⚡ Embedding {len(misses)} texts in {len(batches)} batches "
+              f"({len(unique) - len(misses)} cached)")
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {
+                pool.submit(_embed_batch, embeddings, [t for _, t in batch],
+                            max_retries, base_delay, query): batch
+                for batch in batches
+            }
+            for fut in as_completed(futures):
+                batch = futures[fut]
+                result = [np.asarray(v, dtype=np.float32) for v in fut.result()]
+                items = [(h, v) for (h, _), v in zip(batch, result)]
+                vectors.update(items)
+                if cache is not None:
+                    cache.put_many(model, items)
+
+    return np.vstack([vectors[text_sha256(t)] for t in texts])
+
+
+def add_embeddings(vectorstore, ids, texts, vectors, metadatas=None,
+                   batch_size=INSERT_BATCH_SIZE):
+    """Bulk-insert precomputed vectors into a langchain Chroma store."""
+    collection = vectorstore._collection
+    for start in range(0, len(ids), batch_size):
+        stop = start + batch_size
+        collection.upsert(
+            ids=list(ids[start:stop]),
+            embeddings=np.asarray(vectors[start:stop]).tolist(),
+            documents=list(texts[start:stop]),
+            metadatas=list(metadatas[start:stop]) if metadatas is not None else None,
+        )
@@ -0,0 +1,246 @@
+# ============================================================
+# lexical_index.py — Local BM25 inverted index over RAG_Text
+# ============================================================
+#
+# Merchant names ("mercadona", "vivagym", "renfe") are exact tokens that
+# embeddings often rank poorly. This index keeps NumPy posting lists per
+# token, scores with BM25, supports incremental add / update / remove,
+# and is pickled next to the Chroma collection so it loads in one read.
+
+import os
+import pickle
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+INDEX_FILE = "lexical_index.pkl"
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Template words present in every RAG_Text: no signal for ranking
+STOPWORDS = {
+    "on", "a", "an", "of", "at", "the", "eur", "expense", "income",
+    "categorized", "as", "en", "de", "la", "el", "y", "tarj", "tarjeta",
+}
+
+COMPACT_RATIO = 0.3   # rebuild postings when this share of docs is deleted
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in TOKEN_RE.findall(text) if len(t) > 1 and t not in STOPWORDS]
+
+
+def matches_where(meta, where):
+    """Evaluate the subset of Chroma `where` syntax used by the retriever."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(matches_where(meta, w) for w in where["$and"])
+    if "$or" in where:
+        return any(matches_where(meta, w) for w in where["$or"])
+
+    for key, cond in where.items():
+        value = meta.get(key)
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        for op, target in cond.items():
+            if value is None and op != "$ne":
+                return False
+            if op == "$eq" and value != target:
+                return False
+            if op == "$ne" and value == target:
+                return False
+            if op == "$in" and value not in target:
+                return False
+            if op == "$nin" and value in target:
+                return False
+            if op == "$gte" and not value >= target:
+                return False
+            if op == "$gt" and not value > target:
+                return False
+            if op == "$lte" and not value <= target:
+                return False
+            if op == "$lt" and not value < target:
+                return False
+    return True
+
+
+class LexicalIndex:
+    """BM25 over (id, text, metadata) documents with incremental updates."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.positions = {}
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.postings = {}          # token -> (positions int32, tf float32)
+        self.doc_freq = defaultdict(int)
+
+    # ---------------------------------------------------------
+    # persistence
+    # ---------------------------------------------------------
+    @classmethod
+    def load(cls, directory):
+        path = os.path.join(directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+        return index
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, INDEX_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    # ---------------------------------------------------------
+    # updates
+    # ---------------------------------------------------------
+    def __len__(self):
+        return int(self.alive.sum())
+
+    @property
+    def vocabulary(self):
+        return self.doc_freq.keys()
+
+    def add(self, ids, texts, metadatas=None):
+        """Append documents (an existing id is replaced)."""
+        metadatas = metadatas or [{} for _ in ids]
+        self.remove([i for i in ids if i in self.positions])
+
+        start = len(self.ids)
+        new_postings = defaultdict(lambda: ([], []))
+        lengths = []
+
+        for offset, (doc_id, text, meta) in enumerate(zip(ids, texts, metadatas)):
+            pos = start + offset
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            counts = defaultdict(int)
+            for t in tokens:
+                counts[t] += 1
+            for t, c in counts.items():
+                new_postings[t][0].append(pos)
+                new_postings[t][1].append(c)
+                self.doc_freq[t] += 1
+
+            self.ids.append(doc_id)
+            self.texts.append(text)
+            self.metadatas.append(dict(meta))
+            self.positions[doc_id] = pos
+
+        for t, (p, c) in new_postings.items():
+            p = np.asarray(p, dtype=np.int32)
+            c = np.asarray(c, dtype=np.float32)
+            if t in self.postings:
+                old_p, old_c = self.postings[t]
+                p, c = np.concatenate([old_p, p]), np.concatenate([old_c, c])
+            self.postings[t] = (p, c)
+
+        self.doc_len = np.concatenate([self.doc_len, np.asarray(lengths, dtype=np.int32)])
+        self.alive = np.concatenate([self.alive, np.ones(len(lengths), dtype=bool)])
+
+    def remove(self, ids):
+        for doc_id in ids:
+            pos = self.positions.pop(doc_id, None)
+            if pos is None:
+                continue
+            self.alive[pos] = False
+            for t in set(tokenize(self.texts[pos])):
+                self.doc_freq[t] -= 1
+                if self.doc_freq[t] <= 0:
+                    del self.doc_freq[t]
+
+        if len(self.ids) and (~self.alive).mean() > COMPACT_RATIO:
+            self.compact()
+
+    def update_metadata(self, ids, metadatas):
+        for doc_id, meta in zip(ids, metadatas):
+            pos = self.positions.get(doc_id)
+            if pos is not None:
+                self.metadatas[pos] = dict(meta)
+
+    def compact(self):
+        keep = np.flatnonzero(self.alive)
+        ids = [self.ids[p] for p in keep]
+        texts = [self.texts[p] for p in keep]
+        metas = [self.metadatas[p] for p in keep]
+        self.__init__(self.k1, self.b)
+        self.add(ids, texts, metas)
+
+    def sync(self, ids, texts, metadatas):
+        """
+        Bring the index in line with the dataset: re-tokenize only docs
+        whose text_hash changed, patch metadata-only changes, drop the rest.
+        """
+        wanted = set(ids)
+        self.remove([i for i in list(self.positions) if i not in wanted])
+
+        add, meta_only = [], []
+        for k, doc_id in enumerate(ids):
+            pos = self.positions.get(doc_id)
+            if pos is None:
+                add.append(k)
+                continue
+            old = self.metadatas[pos]
+            if old.get("text_hash") != metadatas[k].get("text_hash"):
+                add.append(k)
+            elif old != metadatas[k]:
+                meta_only.append(k)
+
+        if add:
+            self.add([ids[k] for k in add], [texts[k] for k in add], [metadatas[k] for k in add])
+        if meta_only:
+            self.update_metadata([ids[k] for k in meta_only], [metadatas[k] for k in meta_only])
+
+        return len(add), len(meta_only)
+
+    # ---------------------------------------------------------
+    # search
+    # ---------------------------------------------------------
+    def search(self, query, k=10, where=None):
+        """Return [(id, score)] ranked by BM25 (only docs matching `where`)."""
+        n_docs = len(self)
+        tokens = [t for t in set(tokenize(query)) if t in self.postings]
+        if not n_docs or not tokens:
+            return []
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        avgdl = max(float(self.doc_len[self.alive].mean()), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / avgdl)
+
+        for t in tokens:
+            pos, tf = self.postings[t]
+            df = self.doc_freq.get(t, 0)
+            if not df:
+                continue
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[pos] += idf * tf * (self.k1 + 1) / (tf + norm[pos])
+
+        scores[~self.alive] = 0
+        ranked = np.argsort(-scores, kind="stable")
+
+        hits = []
+        for pos in ranked:
+            if scores[pos] <= 0:
+                break
+            if where and not matches_where(self.metadatas[pos], where):
+                continue
+            hits.append((self.ids[pos], float(scores[pos])))
+            if len(hits) >= k:
+                break
+        return hits
+
+    def document(self, doc_id):
+        pos = self.positions[doc_id]
+        return self.texts[pos], self.metadatas[pos]
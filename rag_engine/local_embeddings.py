@@ -0,0 +1,97 @@
+# ============================================================
+# local_embeddings.py — CPU-only hashed character n-gram embeddings
+# ============================================================
+#
+# No model, no network: each text is tokenized like the BM25 index
+# (lowercase, accents folded, template words dropped) and every
+# character 3/4/5-gram of the token string is hashed into one of `dim`
+# signed buckets (the "hashing trick"). Counts are log-scaled and the
+# vector is L2 normalized, so cosine similarity measures shared
+# n-grams — which suits merchant names and short transaction lines.
+#
+# The whole batch is hashed at once with NumPy rolling hashes over one
+# byte buffer, so a query embeds in well under a millisecond.
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .lexical_index import tokenize
+
+DEFAULT_DIM = 512
+NGRAMS = (3, 4, 5)
+VERSION = 1   # bump when the feature extraction changes
+
+_PRIME = np.uint64(1099511628211)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_SEP = ord("\n")
+
+
+def _mix(h):
+    """splitmix64 finalizer: spreads rolling-hash bits before bucketing."""
+    h = (h ^ (h >> np.uint64(30))) * _MIX_1
+    h = (h ^ (h >> np.uint64(27))) * _MIX_2
+    return h ^ (h >> np.uint64(31))
+
+
+class HashingEmbeddings(Embeddings):
+
+    def __init__(self, dim=DEFAULT_DIM, ngrams=NGRAMS):
+        self.dim = int(dim)
+        self.ngrams = tuple(ngrams)
+        self.model = f"hashing-ngram-v{VERSION}-{self.dim}"
+
+    def _prepare(self, texts):
+        """One byte buffer: ' tok tok ' per text, texts separated by '\\n'."""
+        padded = [" " + " ".join(tokenize(t)) + " " for t in texts]
+        raw = "\n".join(padded).encode("utf-8")
+        lengths = np.fromiter((len(p.encode("utf-8")) + 1 for p in padded), dtype=np.int64,
+                              count=len(padded))
+        return np.frombuffer(raw, dtype=np.uint8).astype(np.uint64), lengths
+
+    def embed_matrix(self, texts):
+        """float32 matrix (len(texts), dim), rows L2 normalized."""
+        texts = [str(t) for t in texts]
+        n = len(texts)
+        out = np.zeros((n, self.dim), dtype=np.float32)
+        if not n:
+            return out
+
+        buf, lengths = self._prepare(texts)
+        row_of = np.repeat(np.arange(n, dtype=np.int64), lengths)[:len(buf)]
+        is_sep = buf == _SEP
+
+        rows, cols, signs = [], [], []
+        for size in self.ngrams:
+            m = len(buf) - size + 1
+            if m <= 0:
+                continue
+            h = np.full(m, size, dtype=np.uint64)
+            crosses = np.zeros(m, dtype=bool)
+            for j in range(size):
+                h = h * _PRIME + buf[j:j + m]
+                crosses |= is_sep[j:j + m]
+            h = _mix(h[~crosses])
+
+            rows.append(row_of[:m][~crosses])
+            cols.append((h % np.uint64(self.dim)).astype(np.int64))
+            signs.append(np.where(h >> np.uint64(63), -1.0, 1.0))
+
+        if rows:
+            flat = np.concatenate(rows) * self.dim + np.concatenate(cols)
+            counts = np.bincount(flat, weights=np.concatenate(signs), minlength=n * self.dim)
+            out[:] = counts.reshape(n, self.dim)
+
+        out = np.sign(out) * np.log1p(np.abs(out))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms > 0, norms, 1.0)
+
+    def embed_documents(self, texts):
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_matrix([text])[0].tolist()
+
+    def embed_queries(self, texts):
+        """Batched embed_query (queries and documents are embedded alike)."""
+        return self.embed_matrix(texts).tolist()
@@ -0,0 +1,240 @@
+# ============================================================
+# retrieval.py — Metadata-filtered retrieval over the transactions
+# ============================================================
+#
+# Each transaction is stored in Chroma with structured metadata
+# (date_int, ym, auto_category, source, type, amount_signed). The
+# retriever extracts date range / category / bank / type from the
+# question and applies them as a `where` pre-filter, so "last month at
+# Santander" is resolved exactly instead of through embedding similarity.
+#
+# Broad questions ("how was my 2024?", "summarize my groceries") also get
+# the month / category summary documents of the requested period, which
+# cover it completely in a few hundred tokens.
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+import pandas as pd
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .lexical_index import tokenize
+from .structured_query import parse_filters, FILLER_WORDS, MONTHS, _fold, _has
+from .summaries import (
+    TRANSACTION, MONTH_SUMMARY, CATEGORY_SUMMARY, MONTH_CATEGORY_SUMMARY,
+)
+
+DEFAULT_K = 6
+FETCH_K = 20
+RRF_K = 60
+SUMMARY_K = 12          # e.g. one summary per month of a year
+BROAD_DAYS = 31         # date ranges longer than this count as broad
+
+BROAD_WORDS = [
+    "summary", "summarize", "summarise", "overview", "overall", "general",
+    "habits", "trend", "trends", "pattern", "patterns", "breakdown", "compare",
+    "evolution", "budget", "resumen", "resume", "resumir", "habitos",
+    "tendencia", "tendencias", "evolucion", "comparar", "presupuesto",
+]
+
+
+def date_int(ts):
+    """Sortable integer date (YYYYMMDD) used in Chroma metadata."""
+    ts = pd.Timestamp(ts)
+    return ts.year * 10000 + ts.month * 100 + ts.day
+
+
+def build_where(filters):
+    """Translate parsed filters into a Chroma `where` clause (or None)."""
+    clauses = []
+
+    if filters.get("start") is not None:
+        clauses.append({"date_int": {"$gte": date_int(filters["start"])}})
+    if filters.get("end") is not None:
+        clauses.append({"date_int": {"$lt": date_int(filters["end"])}})
+    if filters.get("categories"):
+        clauses.append({"auto_category": {"$in": list(filters["categories"])}})
+    if filters.get("sources"):
+        clauses.append({"source": {"$in": list(filters["sources"])}})
+    if filters.get("type"):
+        clauses.append({"type": filters["type"]})
+    if filters.get("doc_types"):
+        clauses.append({"doc_type": {"$in": list(filters["doc_types"])}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def where_for_question(question, today=None):
+    """`where` clause over transaction documents for the question."""
+    return build_where({**parse_filters(question, today=today), "doc_types": [TRANSACTION]})
+
+
+# ================================================================
+# SUMMARIES: month / category rollup documents for broad questions
+# ================================================================
+def is_broad(question, filters):
+    """A question about a whole period or category, not specific payments."""
+    if _has(_fold(question), BROAD_WORDS):
+        return True
+    start, end = filters.get("start"), filters.get("end")
+    return start is not None and end is not None and (end - start).days > BROAD_DAYS
+
+
+def summary_where(filters):
+    """
+    `where` over the summary level that matches the question: month x
+    category when both are given, else month or category summaries.
+    Summaries are not split by bank or type, so those filters are dropped.
+    """
+    dated = filters.get("start") is not None or filters.get("end") is not None
+    if filters.get("categories"):
+        doc_types = [MONTH_CATEGORY_SUMMARY] if dated else [CATEGORY_SUMMARY]
+    else:
+        doc_types = [MONTH_SUMMARY] if dated else [MONTH_SUMMARY, CATEGORY_SUMMARY]
+
+    return build_where({
+        "start": filters.get("start"),
+        "end": filters.get("end"),
+        "categories": filters.get("categories"),
+        "doc_types": doc_types,
+    })
+
+
+def summary_documents(vectorstore, question, today=None, limit=SUMMARY_K):
+    """Summary documents for a broad question, oldest first ([] otherwise)."""
+    filters = parse_filters(question, today=today)
+    if not is_broad(question, filters):
+        return []
+
+    res = vectorstore._collection.get(
+        where=summary_where(filters), include=["documents", "metadatas"],
+    )
+    docs = [
+        Document(page_content=text, metadata=meta or {}, id=doc_id)
+        for doc_id, text, meta in zip(res["ids"], res["documents"], res["metadatas"])
+    ]
+    # Most recent `limit` periods, in chronological order
+    docs.sort(key=lambda d: (d.metadata.get("date_int", 0), d.metadata.get("auto_category", "")))
+    return docs[-limit:]
+
+
+class FilteredRetriever(BaseRetriever):
+    """
+    Similarity search restricted by filters extracted from the question.
+    Falls back to an unfiltered search when the filters match nothing.
+    """
+
+    vectorstore: Any
+    k: int = DEFAULT_K
+    summary_k: int = SUMMARY_K
+    today: Optional[Any] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        where = where_for_question(query, self.today)
+        vector = self.vectorstore.embeddings.embed_query(query)   # embed once
+
+        summaries = summary_documents(self.vectorstore, query, self.today, self.summary_k)
+        k = self.k // 2 if summaries else self.k
+
+        docs = self.vectorstore.similarity_search_by_vector(vector, k=k, filter=where)
+        if not docs:
+            docs = self.vectorstore.similarity_search_by_vector(
+                vector, k=k, filter={"doc_type": TRANSACTION}
+            )
+        return summaries + docs
+
+
+# ================================================================
+# HYBRID: BM25 + vector, fused with reciprocal rank fusion
+# ================================================================
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """rankings: lists of ids, best first. Returns ids by fused score."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def content_terms(query):
+    """Query tokens that are not question / filter vocabulary."""
+    return [t for t in tokenize(query) if t not in FILLER_WORDS and t not in MONTHS]
+
+
+def vector_search(vectorstore, vector, k, where=None):
+    """Similarity search returning Documents that carry their Chroma id."""
+    res = vectorstore._collection.query(
+        query_embeddings=[list(vector)],
+        n_results=k,
+        where=where,
+        include=["documents", "metadatas"],
+    )
+    return [
+        Document(page_content=text, metadata=meta or {}, id=doc_id)
+        for doc_id, text, meta in zip(res["ids"][0], res["documents"][0], res["metadatas"][0])
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Lexical (BM25) and vector search run in parallel, both restricted by
+    the question's metadata filters, and are merged with RRF.
+
+    When every content word of the question is a known index token
+    (e.g. "mercadona last month"), the lexical ranking alone is used and
+    no embedding call is made.
+    """
+
+    vectorstore: Any
+    lexical: Any
+    k: int = DEFAULT_K
+    fetch_k: int = FETCH_K
+    rrf_k: int = RRF_K
+    summary_k: int = SUMMARY_K
+    today: Optional[Any] = None
+
+    def _lexical(self, query, where):
+        return [doc_id for doc_id, _ in self.lexical.search(query, self.fetch_k, where)]
+
+    def _vector(self, query, where):
+        vector = self.vectorstore.embeddings.embed_query(query)
+        docs = vector_search(self.vectorstore, vector, self.fetch_k, where)
+        if not docs:
+            docs = vector_search(self.vectorstore, vector, self.fetch_k, {"doc_type": TRANSACTION})
+        return docs
+
+    def _doc(self, doc_id, vector_docs):
+        if doc_id in vector_docs:
+            return vector_docs[doc_id]
+        text, meta = self.lexical.document(doc_id)
+        return Document(page_content=text, metadata=meta, id=doc_id)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        where = where_for_question(query, self.today)
+
+        terms = content_terms(query)
+        if terms and all(t in self.lexical.postings for t in terms):
+            ids = self._lexical(query, where) or self._lexical(query, {"doc_type": TRANSACTION})
+            if ids:
+                return [self._doc(i, {}) for i in ids[: self.k]]
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            summaries = pool.submit(summary_documents, self.vectorstore, query, self.today, self.summary_k)
+            lexical = pool.submit(self._lexical, query, where)
+            vector = pool.submit(self._vector, query, where)
+            summary_docs, lexical_ids, vector_docs = summaries.result(), lexical.result(), vector.result()
+
+        k = self.k // 2 if summary_docs else self.k
+        by_id = {d.id: d for d in vector_docs}
+        fused = reciprocal_rank_fusion([lexical_ids, list(by_id)], self.rrf_k)
+        return summary_docs + [self._doc(i, by_id) for i in fused[:k]]
@@ -0,0 +1,517 @@
+# ============================================================
+# structured_query.py — Exact answers for aggregate questions
+# ============================================================
+#
+# "How much did I spend in restaurants last month?" does not need
+# retrieval: it needs a filtered sum. This module recognises aggregate
+# intents (metric, date range, category, source, type) in English and
+# Spanish and answers them from per-day rollups of the processed
+# dataset, so the totals are exact and no embedding / LLM call is made.
+
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from data_cleaning.storage import load_processed, resolve_path
+
+ROLLUP_COLUMNS = ["date", "amount_signed", "type", "source", "auto_category"]
+
+MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
+    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
+    "noviembre": 11, "diciembre": 12,
+}
+
+# Period labels do not depend on the process locale (strftime("%B") does)
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+MONTH_NAMES_ES = [
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre",
+]
+
+# Words that map onto the categorizer's labels (accent-free, lowercase).
+# Only words naming the category itself: a merchant ("uber", "amazon")
+# is one slice of its category, so questions naming one go to RAG.
+CATEGORY_ALIASES = {
+    "Supermercado": ["supermercado", "supermarket", "groceries", "grocery", "super"],
+    "Restaurantes": ["restaurante", "restaurant", "comida fuera", "eating out"],
+    "Bares / Cafés": ["bar", "bares", "cafe", "cafes", "coffee", "cafeteria"],
+    "Entretenimiento": ["entretenimiento", "entertainment", "ocio"],
+    "Moda / Ropa": ["moda", "ropa", "clothes", "clothing", "fashion"],
+    "Compras Online": ["compras online", "online shopping", "online"],
+    "Gimnasio / Deporte": ["gimnasio", "gym", "deporte", "sport", "sports"],
+    "Cuidado Personal": ["cuidado personal", "personal care", "peluqueria", "haircut"],
+    "Suscripciones": ["suscripcion", "subscription"],
+    "Salud": ["salud", "health", "medical"],
+    "Transporte / Viajes": ["transporte", "transport", "viaje", "travel", "trip"],
+    "Transferencias": ["transferencia", "transfer"],
+    "MEC": ["mec", "entre cuentas"],
+    "ATM / Efectivo": ["atm", "efectivo", "cash"],
+    "Otros": ["otros", "other"],
+}
+
+SOURCE_ALIASES = {
+    "BG": ["bg", "banco general"],
+    "SD": ["sd", "santander"],
+}
+
+AGGREGATE_WORDS = [
+    "how much", "how many", "total", "sum", "average", "mean", "top",
+    "spent", "spend", "spending", "earned", "income",
+    "cuanto", "cuantos", "cuantas", "gaste", "gastado", "gasto", "gastos",
+    "ingrese", "ingresos", "promedio", "media", "suma", "principales",
+]
+RANKING_WORDS = ["top", "biggest", "largest", "main", "principales", "mayores"]
+CATEGORY_WORDS = ["category", "categories", "categoria", "categorias"]
+
+# Everything the parser understands. A question with any other word of
+# 3+ letters (a merchant, a city...) is left to the RAG chain, because
+# the rollups cannot filter on it and would return a wrong total.
+FILLER_WORDS = set("""
+how much many did do does i my me we our in on at for of the a an to from with and or
+what which was were is are have has had been spend spent spending expenses expense
+total totals sum average mean per month months monthly year years week weeks day days
+this last past previous current today yesterday by bank source category categories
+top main transactions transaction number money eur euros euro income earned earn
+received salary paid pay cost costs net balance savings so far all time overall
+en el la los las de del mi mis me yo he ha cuanto cuantos cuantas gaste gastado gasto
+gastos ingrese ingresos recibi cobre sueldo nomina pague pagado promedio media suma
+mes meses ano anos semana semanas dia dias este esta estos pasado pasada anterior
+actual ultimo ultimos ultimas hoy ayer por banco categoria categorias principales
+mayores transacciones numero dinero que cual cuales fue fueron tengo tuve al lo hasta
+ahora total neto balance ahorro ahorros mensual cada
+""".split())
+
+EXPENSE_WORDS = ["spend", "spent", "spending", "expense", "paid", "pay", "cost",
+                 "gasto", "gastos", "gaste", "gastado", "pague", "pagado"]
+INCOME_WORDS = ["income", "earn", "earned", "received", "salary",
+                "ingreso", "ingresos", "ingrese", "recibi", "cobre", "sueldo", "nomina"]
+COMPARISON_WORDS = ["vs", "versus", "compared", "compare", "comparison",
+                    "comparado", "comparada", "comparar", "comparacion", "frente a"]
+
+# Relative periods understood by parse_date_range
+RELATIVE_PERIODS = {
+    "last_month": ["last month", "previous month", "mes pasado", "mes anterior", "ultimo mes"],
+    "this_month": ["this month", "current month", "este mes", "mes actual"],
+    "last_year": ["last year", "previous year", "ano pasado", "ano anterior"],
+    "this_year": ["this year", "current year", "este ano", "ano actual"],
+    "last_week": ["last week", "semana pasada"],
+    "this_week": ["this week", "esta semana"],
+    "yesterday": ["yesterday", "ayer"],
+    "today": ["today", "hoy"],
+}
+LAST_N_RE = re.compile(
+    r"\b(?:last|past|ultimos|ultimas)\s+(\d+)\s+(days|dias|weeks|semanas|months|meses)\b"
+)
+MONTH_RE = re.compile(rf"\b({'|'.join(MONTHS)})\b(?:\s+(?:de\s+|of\s+)?(\d{{4}}))?")
+YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+
+SPANISH_HINTS = ["cuanto", "cuantos", "cuantas", "gaste", "gastos", "ingresos", "este",
+                 "esta", "mes", "ano", "semana", "en", "de", "el", "la", "mis", "por"]
+
+
+# ============================================================
+# INTENT
+# ============================================================
+@dataclass
+class AggregateQuery:
+    metric: str = "sum"                  # sum | count | avg | monthly_avg
+    group_by: str = None                 # auto_category | ym | source | None
+    start: pd.Timestamp = None           # inclusive
+    end: pd.Timestamp = None             # exclusive
+    period: str = "all time"
+    categories: list = field(default_factory=list)
+    sources: list = field(default_factory=list)
+    type: str = None                     # expense | income | None (net)
+    top_n: int = 5
+    spanish: bool = False
+
+
+def _fold(text):
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _has(text, words):
+    return any(re.search(rf"\b{re.escape(w)}\b", text) for w in words)
+
+
+def is_spanish(text):
+    return sum(_has(text, [w]) for w in SPANISH_HINTS) >= 2
+
+
+def _month_start(ts):
+    return pd.Timestamp(ts.year, ts.month, 1)
+
+
+def _month_label(ts, spanish=False):
+    if spanish:
+        return f"{MONTH_NAMES_ES[ts.month - 1]} de {ts.year}"
+    return f"{MONTH_NAMES[ts.month - 1]} {ts.year}"
+
+
+def parse_date_range(text, today, spanish=False):
+    """
+    Return (start, end_exclusive, label) or (None, None, 'all time'). The
+    label is written in English, or in Spanish when `spanish` is set.
+    """
+    today = pd.Timestamp(today).normalize()
+    this_month = _month_start(today)
+    label = (lambda en, es: es if spanish else en)
+
+    if _has(text, RELATIVE_PERIODS["last_month"]):
+        start = this_month - pd.DateOffset(months=1)
+        return start, this_month, _month_label(start, spanish)
+    if _has(text, RELATIVE_PERIODS["this_month"]):
+        return this_month, this_month + pd.DateOffset(months=1), _month_label(this_month, spanish)
+    if _has(text, RELATIVE_PERIODS["last_year"]):
+        start = pd.Timestamp(today.year - 1, 1, 1)
+        return start, pd.Timestamp(today.year, 1, 1), str(today.year - 1)
+    if _has(text, RELATIVE_PERIODS["this_year"]):
+        start = pd.Timestamp(today.year, 1, 1)
+        return start, pd.Timestamp(today.year + 1, 1, 1), str(today.year)
+    if _has(text, RELATIVE_PERIODS["last_week"]):
+        start = today - pd.Timedelta(days=today.dayofweek + 7)
+        return start, start + pd.Timedelta(days=7), label("last week", "la semana pasada")
+    if _has(text, RELATIVE_PERIODS["this_week"]):
+        start = today - pd.Timedelta(days=today.dayofweek)
+        return start, start + pd.Timedelta(days=7), label("this week", "esta semana")
+    if _has(text, RELATIVE_PERIODS["yesterday"]):
+        return today - pd.Timedelta(days=1), today, label("yesterday", "el día de ayer")
+    if _has(text, RELATIVE_PERIODS["today"]):
+        return today, today + pd.Timedelta(days=1), label("today", "el día de hoy")
+
+    m = LAST_N_RE.search(text)
+    if m:
+        n, unit = int(m.group(1)), m.group(2)
+        if unit in ("days", "dias"):
+            start = today - pd.Timedelta(days=n - 1)
+        elif unit in ("weeks", "semanas"):
+            start = today - pd.Timedelta(weeks=n) + pd.Timedelta(days=1)
+        else:
+            start = this_month - pd.DateOffset(months=n - 1)
+        return start, today + pd.Timedelta(days=1), m.group(0)
+
+    m = MONTH_RE.search(text)
+    if m:
+        month = MONTHS[m.group(1)]
+        year = int(m.group(2)) if m.group(2) else (
+            today.year if month <= today.month else today.year - 1
+        )
+        start = pd.Timestamp(year, month, 1)
+        return start, start + pd.DateOffset(months=1), _month_label(start, spanish)
+
+    m = YEAR_RE.search(text)
+    if m:
+        year = int(m.group(0))
+        return pd.Timestamp(year, 1, 1), pd.Timestamp(year + 1, 1, 1), str(year)
+
+    return None, None, label("all time", "todo el periodo")
+
+
+def count_periods(text):
+    """Number of date expressions in `text` ("march of 2025" counts once)."""
+    n = sum(len(re.findall(rf"\b{re.escape(p)}\b", text))
+            for phrases in RELATIVE_PERIODS.values() for p in phrases)
+    n += len(LAST_N_RE.findall(text)) + len(MONTH_RE.findall(text))
+    return n + len(YEAR_RE.findall(MONTH_RE.sub(" ", text)))
+
+
+def _vocabulary(categories):
+    words = set(FILLER_WORDS) | set(MONTHS)
+    for cat, aliases in CATEGORY_ALIASES.items():
+        for phrase in aliases + [cat]:
+            words.update(re.findall(r"[a-z]+", _fold(phrase)))
+    for cat in categories:
+        words.update(re.findall(r"[a-z]+", _fold(cat)))
+    for aliases in SOURCE_ALIASES.values():
+        for phrase in aliases:
+            words.update(phrase.split())
+    return words
+
+
+def _unknown_terms(text, categories):
+    vocab = _vocabulary(categories)
+    unknown = []
+    for w in re.findall(r"[a-z]{3,}", text):
+        if w in vocab or w.rstrip("s") in vocab or w.rstrip("es") in vocab:
+            continue
+        unknown.append(w)
+    return unknown
+
+
+def parse_filters(question, categories=None, today=None):
+    """
+    Filters mentioned in any question: date range, categories, banks and
+    income/expense. Shared by the aggregate parser and the retriever.
+    """
+    text = _fold(question)
+    known = set(categories) if categories is not None else set(CATEGORY_ALIASES)
+
+    start, end, period = parse_date_range(text, today or pd.Timestamp.today(), is_spanish(text))
+
+    found = []
+    for cat, aliases in CATEGORY_ALIASES.items():
+        names = [_fold(cat)] + aliases
+        if cat in known and any(re.search(rf"\b{re.escape(a)}(?:e?s)?\b", text) for a in names):
+            found.append(cat)
+    for cat in sorted(known - set(CATEGORY_ALIASES)):
+        if re.search(rf"\b{re.escape(_fold(cat))}\b", text):
+            found.append(cat)
+
+    sources = [src for src, aliases in SOURCE_ALIASES.items() if _has(text, aliases)]
+
+    tx_type = None
+    if _has(text, INCOME_WORDS):
+        tx_type = "income"
+    elif _has(text, EXPENSE_WORDS):
+        tx_type = "expense"
+
+    return {
+        "start": start, "end": end, "period": period,
+        "categories": found, "sources": sources, "type": tx_type,
+    }
+
+
+def parse_aggregate_intent(question, categories=None, today=None):
+    """
+    Recognise an aggregate question. Returns an AggregateQuery, or None
+    when the question should go to the regular RAG chain.
+    """
+    text = _fold(question)
+    if not _has(text, AGGREGATE_WORDS):
+        return None
+
+    # "biggest expenses" asks for transactions, not a rollup
+    if _has(text, RANKING_WORDS) and not _has(text, CATEGORY_WORDS):
+        return None
+
+    # Comparisons and several periods ("march and april", "2024 and 2025",
+    # "last month vs this month") need one figure per period: leave them
+    # to the RAG chain rather than answer for the first period only
+    if _has(text, COMPARISON_WORDS) or count_periods(text) > 1:
+        return None
+
+    known = set(categories) if categories is not None else set(CATEGORY_ALIASES)
+    if _unknown_terms(text, known):
+        return None
+
+    q = AggregateQuery()
+    q.spanish = is_spanish(text)
+
+    # Metric
+    if _has(text, ["how many", "number of", "cuantos", "cuantas", "numero de"]):
+        q.metric = "count"
+    elif _has(text, ["average", "mean", "promedio", "media"]):
+        per_month = _has(text, ["per month", "a month", "monthly", "al mes", "por mes", "mensual"])
+        q.metric = "monthly_avg" if per_month else "avg"
+
+    # Grouping
+    if _has(text, CATEGORY_WORDS):
+        q.group_by = "auto_category"
+    elif q.metric != "monthly_avg" and _has(text, ["by month", "per month", "monthly", "por mes", "mensual", "cada mes"]):
+        q.group_by = "ym"
+    elif _has(text, ["by bank", "per bank", "por banco", "by source"]):
+        q.group_by = "source"
+
+    m = re.search(r"\btop\s+(\d+)\b", text)
+    if m:
+        q.top_n = int(m.group(1))
+
+    # Filters
+    f = parse_filters(question, known, today)
+    q.start, q.end, q.period = f["start"], f["end"], f["period"]
+    q.categories, q.sources = f["categories"], f["sources"]
+    q.type = f["type"] or ("expense" if q.group_by == "auto_category" else None)
+
+    # "top categories" must not be narrowed to a category it mentions
+    if q.group_by == "auto_category" and len(q.categories) == 1 and q.metric == "sum":
+        q.group_by = None
+
+    return q
+
+
+# ============================================================
+# ROLLUPS
+# ============================================================
+class Rollups:
+    """
+    Per (day, category, source, type) totals and counts, sorted by day so
+    any date range is two binary searches away.
+    """
+
+    def __init__(self, df):
+        df = df[ROLLUP_COLUMNS].copy()
+        df["day"] = pd.to_datetime(df["date"]).dt.normalize()
+        daily = (
+            df.groupby(["day", "auto_category", "source", "type"], observed=True)["amount_signed"]
+            .agg(total="sum", count="size")
+            .reset_index()
+            .sort_values("day", kind="stable")
+            .reset_index(drop=True)
+        )
+        for col in ("auto_category", "source", "type"):
+            daily[col] = daily[col].astype(str)
+
+        self.daily = daily
+        self.days = daily["day"].to_numpy("datetime64[ns]")
+        self.categories = sorted(daily["auto_category"].unique())
+        self.first_day = daily["day"].min() if len(daily) else None
+        self.last_day = daily["day"].max() if len(daily) else None
+
+    @classmethod
+    def from_processed(cls, path=None):
+        return cls(load_processed(path, columns=ROLLUP_COLUMNS))
+
+    def select(self, q):
+        lo, hi = 0, len(self.days)
+        if q.start is not None:
+            lo = np.searchsorted(self.days, np.datetime64(q.start, "ns"), side="left")
+        if q.end is not None:
+            hi = np.searchsorted(self.days, np.datetime64(q.end, "ns"), side="left")
+
+        rows = self.daily.iloc[lo:hi]
+        if q.categories:
+            rows = rows[rows["auto_category"].isin(q.categories)]
+        if q.sources:
+            rows = rows[rows["source"].isin(q.sources)]
+        if q.type:
+            rows = rows[rows["type"] == q.type]
+        return rows
+
+    def months_in(self, q):
+        """
+        Calendar months of [start, end) clamped to the data, so months
+        without matching transactions still count in averages.
+        """
+        if self.first_day is None:
+            return 0
+        lo = max(q.start, self.first_day) if q.start is not None else self.first_day
+        last = self.last_day + pd.Timedelta(days=1)
+        hi = min(q.end, last) if q.end is not None else last
+        if hi <= lo:
+            return 0
+        last_month = (hi - pd.Timedelta(days=1)).to_period("M")
+        return (last_month - lo.to_period("M")).n + 1
+
+    def compute(self, q):
+        rows = self.select(q)
+        total = float(rows["total"].sum())
+        count = int(rows["count"].sum())
+
+        result = {"total": total, "count": count, "groups": None}
+
+        if q.metric == "avg":
+            result["value"] = total / count if count else 0.0
+        elif q.metric == "monthly_avg":
+            months = self.months_in(q)
+            result["value"] = total / months if months else 0.0
+            result["months"] = int(months)
+        elif q.metric == "count":
+            result["value"] = count
+        else:
+            result["value"] = total
+
+        if q.group_by:
+            key = rows["day"].dt.strftime("%Y-%m") if q.group_by == "ym" else rows[q.group_by]
+            groups = rows.groupby(key)["total"].sum()
+            if q.group_by == "ym":
+                groups = groups.sort_index()
+            else:
+                groups = groups.reindex(groups.abs().sort_values(ascending=False).index).head(q.top_n)
+            result["groups"] = [(str(k), float(v)) for k, v in groups.items()]
+
+        return result
+
+
+_ROLLUPS = {}
+
+
+def get_rollups(path=None):
+    """Rollups memoised per dataset file version."""
+    path = resolve_path(path)
+    mtime = os.path.getmtime(path)
+    memo = _ROLLUPS.get(path)
+    if memo is None or memo[0] != mtime:
+        memo = (mtime, Rollups.from_processed(path))
+        _ROLLUPS[path] = memo
+    return memo[1]
+
+
+# ============================================================
+# ANSWERS
+# ============================================================
+def _eur(x):
+    return f"{x + 0.0:,.2f} EUR"   # + 0.0 turns -0.0 into 0.0
+
+
+def describe(q, result):
+    """Plain-text answer (English or Spanish) built from the computed numbers."""
+    es = q.spanish
+    scope = []
+    if q.categories:
+        scope.append(", ".join(q.categories))
+    if q.sources:
+        scope.append(("banco " if es else "bank ") + "/".join(q.sources))
+    scope = f" ({'; '.join(scope)})" if scope else ""
+
+    kind = {
+        "expense": "Gastos" if es else "Expenses",
+        "income": "Ingresos" if es else "Income",
+        None: "Balance neto" if es else "Net balance",
+    }[q.type]
+    if q.metric == "count" and q.type is None:
+        kind = "Transacciones" if es else "Transactions"
+    period = q.period
+    value = result["value"]
+    sign = -1 if q.type == "expense" else 1
+
+    if q.metric == "count":
+        head = (f"{kind}{scope} en {period}: {value} transacciones."
+                if es else f"{kind}{scope} in {period}: {value} transactions.")
+    elif q.metric == "avg":
+        head = (f"{kind}{scope} en {period}: media de {_eur(sign * value)} por transacción "
+                f"({result['count']} transacciones)."
+                if es else f"{kind}{scope} in {period}: average {_eur(sign * value)} per transaction "
+                f"({result['count']} transactions).")
+    elif q.metric == "monthly_avg":
+        head = (f"{kind}{scope} en {period}: media mensual de {_eur(sign * value)} "
+                f"({result.get('months', 0)} meses)."
+                if es else f"{kind}{scope} in {period}: {_eur(sign * value)} per month on average "
+                f"over {result.get('months', 0)} months.")
+    else:
+        head = (f"{kind}{scope} en {period}: {_eur(sign * value)} en {result['count']} transacciones."
+                if es else f"{kind}{scope} in {period}: {_eur(sign * value)} across {result['count']} transactions.")
+
+    lines = [head]
+    for label, v in result["groups"] or []:
+        lines.append(f"- {label}: {_eur(sign * v)}")
+    return "\n".join(lines)
+
+
+def try_structured_answer(question, rollups=None, today=None):
+    """
+    Answer aggregate questions directly. Returns
+    {"answer", "query", "result"} or None when the question is not an
+    aggregate (or no processed dataset exists yet).
+    """
+    try:
+        rollups = rollups or get_rollups()
+    except FileNotFoundError:
+        return None
+
+    q = parse_aggregate_intent(question, rollups.categories, today=today)
+    if q is None:
+        return None
+
+    result = rollups.compute(q)
+    return {"answer": describe(q, result), "query": q, "result": result}
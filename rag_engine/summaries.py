@@ -0,0 +1,161 @@
+# ============================================================
+# summaries.py — Month / category rollup documents for the RAG
+# ============================================================
+#
+# Six single-transaction sentences are a poor context for "how was my
+# 2024?". These summary documents (per month, per category and per
+# month × category) carry totals, counts, top categories and top
+# merchants in one sentence each, and are indexed next to the
+# transactions. They are computed in bulk with groupby; the vectorstore
+# sync only re-embeds the summaries whose text actually changed.
+
+import pandas as pd
+
+from .structured_query import MONTH_NAMES
+
+TRANSACTION = "transaction"
+MONTH_SUMMARY = "month_summary"
+CATEGORY_SUMMARY = "category_summary"
+MONTH_CATEGORY_SUMMARY = "month_category_summary"
+SUMMARY_TYPES = [MONTH_SUMMARY, CATEGORY_SUMMARY, MONTH_CATEGORY_SUMMARY]
+
+SUMMARY_COLUMNS = ["date", "description", "amount_signed", "auto_category"]
+TOP_N = 3
+
+# "COMPRA NYX*ABServiciosSelecta, Pamplona, TARJETA ..." -> "NYX ABServiciosSelecta"
+CARD_SUFFIX_RE = r"-\d{4}-\d{2}XX-XXXX-\d{4}.*$"
+PURCHASE_PREFIX_RE = r"^(?:COMPRA|PAGO MOVIL EN|PAGO)\s+"
+
+
+def _eur(x):
+    return f"{x + 0.0:,.2f} EUR"
+
+
+def merchant_names(descriptions):
+    """Short merchant label from the bank description (vectorized)."""
+    s = descriptions.astype(str).str.split(",").str[0]
+    s = s.str.replace(CARD_SUFFIX_RE, "", regex=True)
+    s = s.str.replace(PURCHASE_PREFIX_RE, "", regex=True)
+    s = s.str.replace(r"[*\s]+", " ", regex=True).str.strip()
+    return s.str.slice(0, 40).str.strip()
+
+
+def _frame(df):
+    date = pd.to_datetime(df["date"], errors="coerce")
+    amount = pd.to_numeric(df["amount_signed"], errors="coerce").fillna(0.0)
+    out = pd.DataFrame({
+        "ym": date.dt.strftime("%Y-%m"),
+        "category": df["auto_category"].astype(str),
+        "merchant": merchant_names(df["description"]),
+        "expense": (-amount).clip(lower=0),
+        "income": amount.clip(lower=0),
+        "is_expense": amount < 0,
+    })
+    return out[out["ym"].notna()]
+
+
+def _totals(frame, keys):
+    g = frame.groupby(keys, sort=True)
+    return pd.DataFrame({
+        "expense": g["expense"].sum(),
+        "n_expense": g["is_expense"].sum(),
+        "income": g["income"].sum(),
+        "n_income": (~frame["is_expense"]).groupby([frame[k] for k in keys]).sum(),
+    })
+
+
+def _top(frame, keys, by, n=TOP_N):
+    """{group key: "name 12.34 EUR, ..."} for the top-n `by` values by expense."""
+    spent = frame[frame["is_expense"]].groupby(keys + [by], sort=False)["expense"].sum()
+    spent = spent.sort_values(ascending=False, kind="stable")
+    top = spent.groupby(level=list(range(len(keys))), sort=False).head(n)
+
+    labels = {}
+    for idx, value in top.items():
+        key = idx[:-1] if len(keys) > 1 else idx[0]
+        labels.setdefault(key, []).append(f"{idx[-1]} {_eur(value)}")
+    return {k: ", ".join(v) for k, v in labels.items()}
+
+
+def _counts(row):
+    return (
+        f"expenses {_eur(row.expense)} in {int(row.n_expense)} transactions, "
+        f"income {_eur(row.income)} in {int(row.n_income)} transactions, "
+        f"net {_eur(row.income - row.expense)}"
+    )
+
+
+def _month_label(ym):
+    # Fixed names: a locale-dependent label would change the text hash and
+    # re-embed every summary
+    year, month = ym.split("-")
+    return f"{MONTH_NAMES[int(month) - 1]} {year}"
+
+
+def _month_start(ym):
+    year, month = map(int, ym.split("-"))
+    return year * 10000 + month * 100 + 1
+
+
+def _slug(text):
+    return "".join(c if c.isalnum() else "_" for c in text.lower()).strip("_")
+
+
+def build_summaries(df):
+    """
+    Return (ids, texts, metadatas) for every month, category and
+    month × category summary of the processed dataset.
+    """
+    frame = _frame(df)
+    ids, texts, metas = [], [], []
+    if frame.empty:
+        return ids, texts, metas
+
+    # --- per month
+    months = _totals(frame, ["ym"])
+    top_cats = _top(frame, ["ym"], "category")
+    top_merchants = _top(frame, ["ym"], "merchant")
+    for ym, row in months.iterrows():
+        text = f"Monthly summary for {_month_label(ym)} ({ym}): {_counts(row)}."
+        if ym in top_cats:
+            text += f" Top categories: {top_cats[ym]}."
+        if ym in top_merchants:
+            text += f" Top merchants: {top_merchants[ym]}."
+        ids.append(f"sum_m_{ym}")
+        texts.append(text)
+        metas.append({"doc_type": MONTH_SUMMARY, "ym": ym, "date_int": _month_start(ym)})
+
+    # --- per category (whole history)
+    cats = _totals(frame, ["category"])
+    span = frame.groupby("category")["ym"].agg(["min", "max", "nunique"])
+    top_months = _top(frame, ["category"], "ym")
+    top_merchants = _top(frame, ["category"], "merchant")
+    for cat, row in cats.iterrows():
+        first, last, n_months = span.loc[cat]
+        text = (
+            f"Category summary for '{cat}' from {first} to {last}: {_counts(row)}, "
+            f"average expense {_eur(row.expense / max(n_months, 1))} per active month."
+        )
+        if cat in top_months:
+            text += f" Highest spending months: {top_months[cat]}."
+        if cat in top_merchants:
+            text += f" Top merchants: {top_merchants[cat]}."
+        ids.append(f"sum_c_{_slug(cat)}")
+        texts.append(text)
+        metas.append({"doc_type": CATEGORY_SUMMARY, "auto_category": cat})
+
+    # --- per month x category
+    cells = _totals(frame, ["ym", "category"])
+    top_merchants = _top(frame, ["ym", "category"], "merchant")
+    for (ym, cat), row in cells.iterrows():
+        text = f"Summary for '{cat}' in {_month_label(ym)} ({ym}): {_counts(row)}."
+        if (ym, cat) in top_merchants:
+            text += f" Top merchants: {top_merchants[(ym, cat)]}."
+        ids.append(f"sum_mc_{ym}_{_slug(cat)}")
+        texts.append(text)
+        metas.append({
+            "doc_type": MONTH_CATEGORY_SUMMARY, "ym": ym,
+            "date_int": _month_start(ym), "auto_category": cat,
+        })
+
+    return ids, texts, metas
@@ -0,0 +1,127 @@
+# ============================================================
+# tracing.py — LangChain callbacks → instrumentation spans
+# ============================================================
+#
+# Attached per question (config={"callbacks": [handler]}), the handler
+# turns retriever, chain and LLM runs into child spans of the question
+# span: retrieval latency and documents, LLM latency, time to first
+# token, prompt / completion tokens and estimated cost. Token totals
+# are also added to the question span itself.
+
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .context_packing import estimate_tokens
+from .summaries import SUMMARY_TYPES
+
+# USD per 1M tokens (input, output)
+MODEL_PRICES = {
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Chain steps of create_retrieval_chain worth a span of their own
+TRACED_CHAINS = {"retrieval_chain", "stuff_documents_chain"}
+
+
+def token_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost, or None for an unknown model."""
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):   # longest prefix wins
+        if model and model.startswith(name):
+            price_in, price_out = MODEL_PRICES[name]
+            return (prompt_tokens * price_in + completion_tokens * price_out) / 1e6
+    return None
+
+
+def token_usage(response):
+    """(prompt, completion) tokens from an LLMResult, streamed or not."""
+    for generations in response.generations:
+        for gen in generations:
+            usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+
+    def __init__(self, metrics, parent):
+        self.metrics = metrics
+        self.parent = parent
+        self._runs = {}   # run_id -> (name, kind, t0, attrs)
+
+    def _start(self, run_id, name, kind, **attrs):
+        self._runs[run_id] = (name, kind, time.perf_counter(), attrs)
+
+    def _end(self, run_id, **attrs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        name, kind, t0, extra = run
+        self.metrics.child(self.parent, name, kind, time.perf_counter() - t0, **extra, **attrs)
+
+    def _add(self, key, value):
+        if value is not None:
+            self.parent[key] = round(self.parent.get(key, 0) + value, 8)
+
+    # --- retrieval
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        # The packing retriever wraps the candidate retriever: only the
+        # outermost run describes what reaches the prompt
+        self._start(run_id, "retrieval" if parent_run_id not in self._runs else "candidates",
+                    "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        summaries = sum(1 for d in documents if d.metadata.get("doc_type") in SUMMARY_TYPES)
+        tokens = sum(estimate_tokens(d.page_content) for d in documents)
+        if self._runs.get(run_id, ("",))[0] == "retrieval":
+            self._add("documents", len(documents))
+            self._add("context_tokens", tokens)
+        self._end(run_id, documents=len(documents), summaries=summaries, context_tokens=tokens)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    # --- chain steps
+    def on_chain_start(self, serialized, inputs, *, run_id, name=None, **kwargs):
+        name = name or (serialized or {}).get("name")
+        if name in TRACED_CHAINS:
+            self._start(run_id, name, "chain")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    # --- LLM
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "unknown"
+        self._start(run_id, "llm", "llm", model=model)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and "first_token_seconds" not in run[3]:
+            run[3]["first_token_seconds"] = round(time.perf_counter() - run[2], 6)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is None:
+            return
+        prompt, completion = token_usage(response)
+        cost = token_cost(run[3].get("model"), prompt, completion)
+
+        self._add("prompt_tokens", prompt)
+        self._add("completion_tokens", completion)
+        self._add("cost_usd", cost)
+        self._end(run_id, prompt_tokens=prompt, completion_tokens=completion, cost_usd=cost)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
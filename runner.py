@@ -1,33 +1,224 @@
 from data_cleaning import load_all, normalize, categorize, enrich, convert_usd_to_eur
+from data_cleaning import loader, fx_converter, normalizer, categorizer, enricher, utils, fingerprints, schema
+from data_cleaning.stage_cache import StageCache, file_digest, code_digest, data_digest, stage_key
+from data_cleaning.storage import save_processed, load_processed, processed_columns, PROCESSED_PATH
+from data_cleaning.fingerprints import FingerprintIndex, index_path_for
+from data_cleaning.normalizer import with_cumulative_balance
+from data_cleaning.schema import memory_report, format_memory_report
+from data_cleaning.utils import transaction_ids
+from instrumentation import get_instrumentation
+import argparse
 import os
 
-OUTPUT_PATH = "data/Finance_Processed.csv"
+import pandas as pd
 
+OUTPUT_PATH = PROCESSED_PATH
+INPUT_SOURCES = [
+    ("BG", "data/BG_Transaccions.xlsx"),
+    ("SD", "data/SD_Transaccions.xlsx"),
+]
 
-def run_pipeline():
-    print("📥 Loading raw datasets...")
-    df = load_all(
-        "data/BG_Transaccions.xlsx",
-        "data/SD_Transaccions.xlsx",
+
+def stage_keys(sources=INPUT_SOURCES, fx_path=fx_converter.CACHE_PATH):
+    """
+    Chained cache keys. A stage key covers its own code and inputs plus
+    the key of the stage before it, so a change only invalidates the
+    stages downstream of it.
+    """
+    keys = {}
+    keys["load"] = stage_key(
+        *[f"{bank}:{file_digest(path)}" for bank, path in sources],
+        code_digest(loader, utils, fingerprints, schema),
+    )
+    keys["fx"] = stage_key(
+        keys["load"],
+        file_digest(fx_path),
+        code_digest(fx_converter),
     )
+    keys["normalize"] = stage_key(keys["fx"], code_digest(normalizer))
+    keys["categorize"] = stage_key(
+        keys["normalize"],
+        data_digest(categorizer.CATEGORY_PATTERNS),
+        code_digest(categorizer),
+    )
+    keys["enrich"] = stage_key(keys["categorize"], code_digest(enricher, utils))
+    return keys
+
+
+def fx_stage(fx_path=fx_converter.CACHE_PATH):
+    """USD → EUR stage reading the rate table at `fx_path` (.npz cache next to it)."""
+    binary_path = os.path.splitext(fx_path)[0] + ".npz"
+    return lambda df: convert_usd_to_eur(df, fx=fx_converter.load_fx_table(fx_path, binary_path))
+
+
+def pipeline_stages(sources, fx_path=fx_converter.CACHE_PATH):
+    return [
+        ("load", "📥 Loading raw datasets...", lambda _: load_all(*sources)),
+        ("fx", "💱 Converting USD → EUR...", fx_stage(fx_path)),
+        ("normalize", "🧼 Normalizing data...", normalize),
+        ("categorize", "🏷️ Categorizing transactions...", categorize),
+        ("enrich", "📈 Enriching for RAG...", enrich),
+    ]
+
+
+def save_index(df, output_path):
+    """Fingerprints of everything in the dataset, for later incremental runs."""
+    if "fingerprint" in df.columns:
+        FingerprintIndex(df["fingerprint"].to_numpy()).save(index_path_for(output_path))
+
+
+def run_pipeline(use_cache=True, export_csv=False, partition=False, sources=None,
+                 fx_path=fx_converter.CACHE_PATH, output_path=OUTPUT_PATH, trace_memory=False,
+                 report_memory=False):
+    sources = sources or INPUT_SOURCES
+    cache = StageCache(enabled=use_cache)
+    metrics = get_instrumentation()
+    csv_path = os.path.splitext(output_path)[0] + ".csv" if export_csv else None
+
+    stages = pipeline_stages(sources, fx_path)
+
+    # Every stage is a span (seconds, rows in/out, memory) of the run span
+    with metrics.span("run_pipeline", kind="pipeline", use_cache=use_cache) as run:
+        with metrics.span("stage_keys", kind="stage"):
+            keys = stage_keys(sources, fx_path)
 
-    print("💱 Converting USD → EUR...")
-    df = convert_usd_to_eur(df)
+        # Resume from the latest stage whose output is already cached
+        df, start = None, 0
+        for i in range(len(stages) - 1, -1, -1):
+            name = stages[i][0]
+            df = cache.load(name, keys[name])
+            if df is not None:
+                print(f"♻️ Reusing cached '{name}' stage")
+                start = i + 1
+                break
+        run["resumed_after"] = stages[start - 1][0] if start else None
 
-    print("🧼 Normalizing data...")
-    df = normalize(df)
+        reports = {}
+        for name, msg, fn in stages[start:]:
+            print(msg)
+            with metrics.span(name, kind="stage", memory=trace_memory) as span:
+                span["rows_in"] = 0 if df is None else len(df)
+                df = fn(df)
+                span["rows_out"] = len(df)
+                if report_memory:
+                    reports[name] = memory_report(df)
+                    span["frame_mb"] = reports[name]["mb"]
+            cache.save(name, keys[name], df)
 
-    print("🏷️ Categorizing transactions...")
-    df = categorize(df)
+        print("💾 Saving final dataset...")
+        with metrics.span("save", kind="stage", memory=trace_memory) as span:
+            span["rows_in"] = len(df)
+            save_processed(
+                df,
+                output_path,
+                partition=partition,
+                csv_path=csv_path,
+            )
+            save_index(df, output_path)
+        run["rows_out"] = len(df)
 
-    print("📈 Enriching for RAG...")
-    df = enrich(df)
+    if reports:
+        print("\n🧠 In-memory footprint per stage\n" + format_memory_report(reports) + "\n")
+    print(f"✅ Saved to {output_path}" + (f" (+ {csv_path})" if csv_path else ""))
+    return df
 
-    print("💾 Saving final dataset...")
-    os.makedirs("data", exist_ok=True)
-    df.to_csv(OUTPUT_PATH, index=False)
-    print(f"✅ Saved to {OUTPUT_PATH}")
+
+def run_incremental(export_csv=False, partition=False, sources=None,
+                    fx_path=fx_converter.CACHE_PATH, output_path=OUTPUT_PATH):
+    """
+    Ingest only transactions the dataset does not contain yet. Exports
+    are still parsed in full, but rows whose fingerprint is already in
+    the index skip FX, normalization, categorization and enrichment; the
+    new rows are merged into the stored dataset.
+    """
+    sources = sources or INPUT_SOURCES
+    metrics = get_instrumentation()
+    csv_path = os.path.splitext(output_path)[0] + ".csv" if export_csv else None
+    index_path = index_path_for(output_path)
+
+    if not os.path.exists(output_path) or "fingerprint" not in processed_columns(output_path):
+        print("ℹ️ No fingerprinted dataset yet: running the full pipeline")
+        return run_pipeline(export_csv=export_csv, partition=partition, sources=sources,
+                            fx_path=fx_path, output_path=output_path)
+
+    stages = pipeline_stages(sources, fx_path)
+
+    with metrics.span("run_incremental", kind="pipeline") as run:
+        index = FingerprintIndex.load(index_path)
+        if not len(index):
+            index = FingerprintIndex(load_processed(output_path, columns=["fingerprint"])["fingerprint"])
+
+        name, msg, fn = stages[0]
+        print(msg)
+        with metrics.span(name, kind="stage") as span:
+            df = fn(None)
+            span["rows_out"] = len(df)
+
+        with metrics.span("fingerprint_lookup", kind="stage") as span:
+            fresh = index.unseen(df["fingerprint"].to_numpy())
+            df = df[fresh].reset_index(drop=True)
+            span["rows_in"], span["rows_out"] = len(fresh), len(df)
+        print(f"🧮 {len(df)} new of {len(fresh)} rows ({len(fresh) - len(df)} already ingested)")
+        run["rows_new"] = len(df)
+
+        if df.empty:
+            print(f"✅ {output_path} already up to date")
+            return load_processed(output_path)
+
+        for name, msg, fn in stages[1:]:
+            print(msg)
+            with metrics.span(name, kind="stage") as span:
+                span["rows_in"] = len(df)
+                df = fn(df)
+                span["rows_out"] = len(df)
+
+        print("💾 Merging into the stored dataset...")
+        with metrics.span("save", kind="stage") as span:
+            stored = load_processed(output_path)
+            combined = with_cumulative_balance(pd.concat([stored, df], ignore_index=True))
+            combined["tx_id"] = transaction_ids(combined)   # same-day repeats need the full set
+            save_processed(combined, output_path, partition=partition, csv_path=csv_path)
+            index.add(df["fingerprint"].to_numpy())
+            index.save(index_path)
+            span["rows_out"] = len(combined)
+        run["rows_out"] = len(combined)
+
+    print(f"✅ Added {len(df)} transactions to {output_path}")
+    return combined
 
 
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="Run the finance cleaning pipeline.")
+    parser.add_argument("--input", action="append", metavar="BANK=PATH",
+                        help="statement to ingest (repeatable); defaults to the BG + SD workbooks")
+    parser.add_argument("--no-cache", action="store_true", help="recompute every stage")
+    parser.add_argument("--csv", action="store_true", help="also export Finance_Processed.csv")
+    parser.add_argument("--partition", action="store_true",
+                        help="write a year=/month= partitioned Parquet dataset")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record peak traced memory per stage (slower)")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="print the DataFrame footprint after each stage (per column for the last)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process transactions not already in the dataset")
+    args = parser.parse_args()
+
+    sources = None
+    if args.input:
+        sources = [tuple(item.split("=", 1)) for item in args.input]
+
+    if args.incremental:
+        run_incremental(
+            sources=sources,
+            export_csv=args.csv,
+            partition=args.partition,
+        )
+    else:
+        run_pipeline(
+            sources=sources,
+            use_cache=not args.no_cache,
+            export_csv=args.csv,
+            partition=args.partition,
+            trace_memory=args.trace_memory,
+            report_memory=args.memory_report,
+        )
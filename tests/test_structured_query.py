@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from rag_engine.structured_query import Rollups, parse_aggregate_intent, try_structured_answer
+
+TODAY = "2025-11-15"
+
+
+@pytest.fixture(scope="module")
+def rollups():
+    rows = [
+        ("2025-01-10", -100.0, "expense", "BG", "Restaurantes"),
+        ("2025-03-05", -30.0, "expense", "BG", "Restaurantes"),
+        ("2025-03-20", -20.0, "expense", "SD", "Supermercado"),
+        ("2025-04-02", -50.0, "expense", "SD", "Supermercado"),
+        ("2025-10-08", -40.0, "expense", "BG", "Restaurantes"),
+        ("2025-11-03", 1000.0, "income", "BG", "Otros"),
+        ("2025-11-04", -10.0, "expense", "BG", "Restaurantes"),
+        ("2024-06-01", -70.0, "expense", "SD", "Supermercado"),
+    ]
+    df = pd.DataFrame(rows, columns=["date", "amount_signed", "type", "source", "auto_category"])
+    df["date"] = pd.to_datetime(df["date"])
+    return Rollups(df)
+
+
+@pytest.mark.parametrize("question", [
+    "How much did I spend in March and April 2025?",
+    "How much did I spend in 2024 and 2025?",
+    "How much did I spend on restaurants last month vs this month?",
+    "¿Cuánto gasté en marzo y abril de 2025?",
+    "How much did I spend this month compared to last month?",
+])
+def test_several_periods_go_to_rag(rollups, question):
+    assert try_structured_answer(question, rollups, today=TODAY) is None
+
+
+@pytest.mark.parametrize("question", [
+    "How much did I spend in March 2025?",
+    "¿Cuánto gasté en marzo de 2025?",
+])
+def test_single_month(rollups, question):
+    res = try_structured_answer(question, rollups, today=TODAY)
+    assert res["result"]["value"] == pytest.approx(-50.0)
+    assert res["result"]["count"] == 2
+
+
+def test_merchant_goes_to_rag(rollups):
+    assert try_structured_answer("¿Cuánto gasté en Uber en 2025?", rollups, today=TODAY) is None
+
+
+def test_spanish_month_label(rollups):
+    res = try_structured_answer("¿Cuánto gasté el mes pasado?", rollups, today=TODAY)
+    assert "octubre de 2025" in res["answer"]
+
+
+def test_monthly_average_counts_empty_months(rollups):
+    # Jan..Nov 2025 is 11 calendar months, only 5 of them with expenses
+    q = parse_aggregate_intent("How much did I spend per month on average in 2025?",
+                               rollups.categories, today=TODAY)
+    result = rollups.compute(q)
+    assert result["months"] == 11
+    assert result["value"] == pytest.approx(-250.0 / 11)
+
+
+def test_monthly_average_window_clamped_to_data(rollups):
+    q = parse_aggregate_intent("Average spending per month", rollups.categories, today=TODAY)
+    # 2024-06 .. 2025-11
+    assert rollups.months_in(q) == 18
+
+
+def test_count_without_type_is_neutral(rollups):
+    res = try_structured_answer("How many transactions in March 2025?", rollups, today=TODAY)
+    assert res["answer"].startswith("Transactions in March 2025: 2 transactions")